@@ -1,11 +1,18 @@
 # precache_models.py
 import os
+import sys
 import tomli 
 
+# The embedding backends live in the pipeline package (under src/ in the repository,
+# copied next to this script in the Docker image).
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
 def main():
     """
     Downloads and caches the sentence-transformer model defined in the config.
-    This script is intended to be run during the Docker build process.
+    With the "onnx" embedding backend, it also exports the model to ONNX (and an
+    int8-quantized copy if `quantize` is set) and checks that the export embeds like
+    the torch model. This script is intended to be run during the Docker build process.
     """
     print("--- Starting model pre-caching ---")
 
@@ -16,6 +23,8 @@ def main():
         
         # Get the model name from the config file
         model_name = config.get("vector_store", {}).get("embedding_model_name")
+        backend = config.get("vector_store", {}).get("embedding_backend", "torch")
+        quantize = config.get("vector_store", {}).get("quantize", False)
         
         if not model_name:
             raise ValueError("`embedding_model_name` not found in config.toml under [vector_store]")
@@ -42,7 +51,30 @@ def main():
             import sys
             sys.exit(1)
 
+        if backend == "onnx":
+            export_and_verify_onnx(model_name_to_cache, CACHE_DIR, quantize)
+
     print("--- Model pre-caching finished ---")
 
+def export_and_verify_onnx(model_name: str, cache_dir: str, quantize: bool):
+    """Exports the model to ONNX and fails the build if it does not match the torch model."""
+    from pipeline.embeddings import (
+        PARITY_THRESHOLD, OnnxBackend, SentenceTransformerBackend, check_parity, export_onnx
+    )
+
+    try:
+        print(f"Exporting {model_name} to ONNX{' (with int8 quantization)' if quantize else ''}")
+        model_dir = export_onnx(model_name, cache_folder=cache_dir, quantize=quantize)
+        reference = SentenceTransformerBackend(model_name, cache_folder=cache_dir)
+        similarity = check_parity(reference, OnnxBackend(model_dir, quantized=quantize))
+    except Exception as e:
+        print(f"ERROR: Could not export model {model_name} to ONNX. Reason: {e}")
+        sys.exit(1)
+
+    print(f"Lowest cosine similarity between torch and ONNX embeddings: {similarity:.4f}")
+    if similarity < PARITY_THRESHOLD:
+        print(f"ERROR: ONNX export of {model_name} is below the parity threshold of {PARITY_THRESHOLD}.")
+        sys.exit(1)
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
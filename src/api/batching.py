@@ -0,0 +1,73 @@
+# api/batching.py
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import List, Tuple
+
+import numpy as np
+
+from pipeline.embeddings import EmbeddingBackend
+
+
+class QueryEmbeddingBatcher:
+    """
+    Embeds query texts from many concurrent requests together. Texts submitted within
+    `max_wait_ms` of the first one (up to `max_batch_size`) are encoded in a single
+    `encode` call on a background thread, and each caller gets its own vector back.
+    Texts submitted while a batch is being encoded simply wait for the next batch.
+    """
+    def __init__(self, backend: EmbeddingBackend, max_batch_size: int = 32, max_wait_ms: float = 3.0):
+        self.backend = backend
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self._queue: "queue.Queue[Tuple[str, Future]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="query-embedding-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, text: str) -> Future:
+        """Queues `text` for embedding. The future resolves to its normalized vector."""
+        future: Future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def submit_many(self, texts: List[str]) -> List[Future]:
+        """Queues several texts at once, so they are encoded in as few batches as possible."""
+        futures: List[Future] = [Future() for _ in texts]
+        for text, future in zip(texts, futures):
+            self._queue.put((text, future))
+        return futures
+
+    def embed(self, text: str) -> np.ndarray:
+        """Embeds `text`, blocking until the batch it joined has been encoded."""
+        return self.submit(text).result()
+
+    def _collect(self) -> List[Tuple[str, Future]]:
+        """Waits for a text, then gathers more until the batch is full or the window closes."""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                # With no time left, still take whatever is already queued
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            # Callers that gave up (e.g. timed out) are dropped before encoding
+            batch = [(text, future) for text, future in self._collect() if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                vectors = self.backend.encode([text for text, _ in batch], batch_size=len(batch))
+            except Exception as e:
+                logging.error(f"Failed to embed a batch of {len(batch)} queries: {e}")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), vector in zip(batch, vectors):
+                future.set_result(vector)
@@ -11,4 +11,44 @@ def get_api_config():
 def get_embedding_model_name():
     """Returns the embedding model name from the config."""
     config = get_api_config()
-    return config.get("vector_store", {}).get("embedding_model_name", "all-MiniLM-L6-v2")
\ No newline at end of file
+    return config.get("vector_store", {}).get("embedding_model_name", "all-MiniLM-L6-v2")
+
+def get_embedding_backend_settings():
+    """Returns the embedding backend ("torch" or "onnx") and whether to use the int8-quantized model."""
+    vector_store = get_api_config().get("vector_store", {})
+    return vector_store.get("embedding_backend", "torch"), vector_store.get("quantize", False)
+
+def get_query_batching_settings():
+    """Returns the largest query embedding batch and how long (ms) to wait for it to fill."""
+    api = get_api_config().get("api", {})
+    return api.get("embed_batch_max_size", 32), api.get("embed_batch_max_wait_ms", 3.0)
+
+def get_query_concurrency_settings():
+    """
+    Returns the limits on query handling: requests served at once, the per-request
+    timeout (seconds), and the threads for ChromaDB searches and for loading packs.
+    """
+    api = get_api_config().get("api", {})
+    return (
+        api.get("max_concurrent_requests", 64),
+        api.get("request_timeout", 10.0),
+        api.get("query_threads", 8),
+        api.get("load_threads", 2)
+    )
+
+def get_batch_query_limit():
+    """Returns the largest number of queries accepted in one /query/batch request."""
+    return get_api_config().get("api", {}).get("max_batch_queries", 64)
+
+def get_query_cache_settings():
+    """
+    Returns whether the query result cache is enabled, its size (entries), the TTL of
+    an entry (seconds) and the cosine similarity for semantic hits (0 = exact hits only).
+    """
+    api = get_api_config().get("api", {})
+    return (
+        api.get("query_cache", True),
+        api.get("query_cache_size", 1024),
+        api.get("query_cache_ttl", 600.0),
+        api.get("query_cache_similarity", 0.0)
+    )
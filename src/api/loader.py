@@ -1,15 +1,18 @@
 # api/loader.py
 import os
+import json
 import logging
 import tarfile
 import shutil
 import time
 from functools import lru_cache
+from typing import Any, Dict, Optional
 
 import chromadb
-from sentence_transformers import SentenceTransformer
+from pipeline.embeddings import load_embedding_backend
+from .batching import QueryEmbeddingBatcher
 from .storage import get_storage_provider
-from .config import get_embedding_model_name
+from .config import get_embedding_backend_settings, get_embedding_model_name, get_query_batching_settings
 
 # --- Configuration ---
 # The root directory inside the container for storing extracted knowledge packs.
@@ -19,20 +22,47 @@ HF_CACHE_DIR = os.environ.get("SENTENCE_TRANSFORMERS_HOME")
 
 # --- In-Memory Caching for Models and Clients ---
 chroma_clients = {}
+# The metadata.json of each loaded pack, which records the model its vectors were built with.
+pack_metadata: Dict[str, Dict[str, Any]] = {}
 
-@lru_cache(maxsize=1)
-def get_embedding_model():
+def get_embedding_model(model_name: Optional[str] = None):
     """
-    Loads and returns the sentence-transformer model specified in the config,
-    explicitly using the pre-cached directory.
+    Returns the embedding backend for `model_name` (by default the model specified in
+    the config). Each model is loaded once and shared by all requests.
     """
-    model_name = get_embedding_model_name()
-    logging.info(f"Loading embedding model '{model_name}' from cache path '{HF_CACHE_DIR}'...")
+    return _load_embedding_model(model_name or get_embedding_model_name())
+
+@lru_cache(maxsize=None)
+def _load_embedding_model(model_name: str):
+    """
+    Loads the embedding backend for a model, explicitly using the pre-cached
+    directory. With the "onnx" backend this needs neither torch nor sentence-transformers.
+    """
+    backend, quantize = get_embedding_backend_settings()
+    logging.info(f"Loading embedding model '{model_name}' ({backend}) from cache path '{HF_CACHE_DIR}'...")
     
     # IMPROVEMENT: Be explicit about the cache folder to ensure it uses the
     # files baked into the Docker image. This removes ambiguity.
-    model = SentenceTransformer(model_name, cache_folder=HF_CACHE_DIR)
-    return model
+    return load_embedding_backend(model_name, backend=backend, quantize=quantize, cache_folder=HF_CACHE_DIR)
+
+@lru_cache(maxsize=None)
+def get_query_batcher(model_name: str) -> QueryEmbeddingBatcher:
+    """Returns the batcher that embeds concurrent queries for `model_name` together."""
+    max_batch_size, max_wait_ms = get_query_batching_settings()
+    return QueryEmbeddingBatcher(get_embedding_model(model_name), max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+
+def get_pack_model_name(target: str) -> str:
+    """The embedding model a loaded pack was built with; queries must be embedded with it."""
+    return pack_metadata.get(target, {}).get("embedding_model") or get_embedding_model_name()
+
+def _read_pack_metadata(target_dir: str, collection) -> Dict[str, Any]:
+    """Reads a pack's metadata.json, falling back to the model recorded on the collection."""
+    try:
+        with open(os.path.join(target_dir, "metadata.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError) as e:
+        logging.warning(f"Could not read metadata.json in {target_dir}: {e}")
+        return {"embedding_model": (collection.metadata or {}).get("embedding_model")}
 
 def load_knowledge_pack(target: str):
     """
@@ -100,7 +130,17 @@ def load_knowledge_pack(target: str):
 
     logging.info(f"Loading ChromaDB collection for '{target}' from {db_path}")
     client = chromadb.PersistentClient(path=db_path)
-    collection = client.get_collection(name=target)
-    
+    # Queries are embedded by the API itself (see get_embedding_model), so the collection
+    # does not need ChromaDB's default embedding function and its separate model
+    collection = client.get_collection(name=target, embedding_function=None)
+
+    metadata = _read_pack_metadata(target_dir, collection)
+    model_name = metadata.get("embedding_model")
+    if model_name and model_name != get_embedding_model_name():
+        logging.warning(
+            f"Knowledge pack '{target}' was built with '{model_name}', not the configured "
+            f"'{get_embedding_model_name()}'. Its queries will be embedded with '{model_name}'."
+        )
+    pack_metadata[target] = metadata
     chroma_clients[target] = collection
     return collection
\ No newline at end of file
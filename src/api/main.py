@@ -1,15 +1,46 @@
 # api/main.py
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import asyncio
 import logging
 
-from .loader import load_knowledge_pack, get_embedding_model
+from .config import get_batch_query_limit, get_query_cache_settings, get_query_concurrency_settings
+from .loader import chroma_clients, load_knowledge_pack, get_pack_model_name, get_query_batcher
+from .query_cache import QueryCache
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 app = FastAPI(title="Knowledge Pack Query API")
 
+# --- Concurrency Limits ---
+# Blocking work runs on dedicated, sized executors so that it never ties up the event
+# loop: cold pack downloads and model loads on one, ChromaDB searches on another. Query
+# embedding runs on the batcher's own thread (see api/batching.py). A target that is
+# cold-loading therefore cannot hold up queries for targets that are already loaded.
+MAX_CONCURRENT_REQUESTS, REQUEST_TIMEOUT, QUERY_THREADS, LOAD_THREADS = get_query_concurrency_settings()
+MAX_BATCH_QUERIES = get_batch_query_limit()
+query_executor = ThreadPoolExecutor(max_workers=QUERY_THREADS, thread_name_prefix="chroma-query")
+load_executor = ThreadPoolExecutor(max_workers=LOAD_THREADS, thread_name_prefix="pack-load")
+
+# Results of recent queries (see api/query_cache.py); None when disabled in config.toml.
+QUERY_CACHE_ENABLED, QUERY_CACHE_SIZE, QUERY_CACHE_TTL, QUERY_CACHE_SIMILARITY = get_query_cache_settings()
+query_cache = QueryCache(QUERY_CACHE_SIZE, QUERY_CACHE_TTL, QUERY_CACHE_SIMILARITY) if QUERY_CACHE_ENABLED else None
+
+# Requests currently being served, and pack loads in progress (shared by all requests for a target).
+requests_in_flight = 0
+packs_loading: Dict[str, asyncio.Future] = {}
+
+class PackNotFoundError(FileNotFoundError):
+    """Raised when no knowledge pack can be found for a target."""
+    def __init__(self, target: str):
+        super().__init__(
+            f"Knowledge pack for target '{target}' not found. It may not have been built or has a different name."
+        )
+        self.target = target
+
 class QueryRequest(BaseModel):
     target: str
     query_text: str
@@ -20,43 +51,206 @@ class QueryResponse(BaseModel):
     metadatas: List[List[Dict[str, Any]]]
     distances: List[List[float]]
 
-@app.post("/query", response_model=QueryResponse)
-def query_knowledge_pack(request: QueryRequest):
+class BatchQueryRequest(BaseModel):
+    queries: List[QueryRequest]
+
+class BatchQueryResponse(BaseModel):
+    # One response per query, in request order
+    results: List[QueryResponse]
+
+def _load_pack_and_model(target: str):
+    """Loads a pack and the model its queries are embedded with. Runs on the load executor."""
+    collection = load_knowledge_pack(target)
+    get_query_batcher(get_pack_model_name(target))
+    return collection
+
+async def get_collection(target: str):
     """
-    Receives a query and a target, loads the corresponding knowledge pack (if not cached),
-    and returns the results from the vector store.
+    Returns the ChromaDB collection for a target. Loaded targets are returned right
+    away; otherwise the pack is loaded once on the load executor, however many
+    requests are waiting for it.
     """
+    collection = chroma_clients.get(target)
+    if collection is not None:
+        return collection
+    if target not in packs_loading:
+        loading = asyncio.get_running_loop().run_in_executor(load_executor, _load_pack_and_model, target)
+        packs_loading[target] = loading
+
+        def finished(future: asyncio.Future) -> None:
+            packs_loading.pop(target, None)
+            if not future.cancelled():
+                future.exception()  # Errors reach the waiting requests; don't log them as unretrieved
+        loading.add_done_callback(finished)
     try:
-        logging.info(f"Received query for target: '{request.target}'")
-        
-        # 1. Load the ChromaDB collection for the target.
-        # This function handles the caching logic (download from GCS if needed).
-        collection = load_knowledge_pack(request.target)
-        
-        # 2. Load the embedding model (this is also cached in memory).
-        embedding_model = get_embedding_model()
-        
-        # 3. Query the collection.
-        results = collection.query(
-            query_texts=[request.query_text],
-            n_results=request.n_results,
-            # We don't need to provide the embeddings here because ChromaDB can
-            # use the embedding function associated with the collection,
-            # but for clarity and control, we could embed here and pass `query_embeddings`.
-        )
-        
-        # FastAPI will automatically serialize this Pydantic model to JSON
-        return QueryResponse(
-            documents=results.get('documents', []),
-            metadatas=results.get('metadatas', []),
-            distances=results.get('distances', [])
+        # A request that times out must not cancel the load other requests are waiting for
+        return await asyncio.shield(packs_loading[target])
+    except FileNotFoundError as e:
+        raise PackNotFoundError(target) from e
+
+async def search(collection, query_embeddings: List[List[float]], n_results: int) -> Dict[str, Any]:
+    """Searches a collection with one or more query vectors on the query executor."""
+    return await asyncio.get_running_loop().run_in_executor(query_executor, partial(
+        collection.query,
+        query_embeddings=query_embeddings,
+        n_results=n_results,
+    ))
+
+def to_response(results: Dict[str, Any], index: int = 0) -> QueryResponse:
+    """The results of the `index`-th query vector of a collection search."""
+    return QueryResponse(
+        documents=results.get('documents', [])[index:index + 1],
+        metadatas=results.get('metadatas', [])[index:index + 1],
+        distances=results.get('distances', [])[index:index + 1]
+    )
+
+def cached_result(query: QueryRequest, embedding=None) -> Optional[QueryResponse]:
+    """
+    Looks a query up in the result cache: by its text (exact tier) or, once it is
+    embedded, by similarity to earlier queries (semantic tier).
+    """
+    if query_cache is None:
+        return None
+    if embedding is None:
+        return query_cache.get(query.target, query.query_text, query.n_results)
+    return query_cache.get_similar(query.target, query.n_results, embedding)
+
+def cache_result(query: QueryRequest, embedding, response: QueryResponse) -> None:
+    if query_cache is not None:
+        query_cache.put(query.target, query.query_text, query.n_results, response, embedding)
+
+async def run_query(request: QueryRequest) -> QueryResponse:
+    # 1. Load the ChromaDB collection for the target.
+    # This function handles the caching logic (download from GCS if needed).
+    collection = await get_collection(request.target)
+    cached = cached_result(request)
+    if cached is not None:
+        return cached
+
+    # 2. Embed the query with the model the pack was built with. Concurrent
+    # queries are batched into a single forward pass.
+    batcher = get_query_batcher(get_pack_model_name(request.target))
+    query_embedding = await asyncio.wrap_future(batcher.submit(request.query_text))
+    cached = cached_result(request, query_embedding)
+    if cached is not None:
+        return cached
+
+    # 3. Search the collection with the vector.
+    results = await search(collection, [query_embedding.tolist()], request.n_results)
+
+    # FastAPI will automatically serialize this Pydantic model to JSON
+    response = to_response(results)
+    cache_result(request, query_embedding, response)
+    return response
+
+async def run_batch_query(request: BatchQueryRequest) -> BatchQueryResponse:
+    queries = request.queries
+    responses: List[Any] = [None] * len(queries)
+
+    # 1. Load every target's collection (once each, concurrently).
+    targets = list(dict.fromkeys(query.target for query in queries))
+    collections = dict(zip(targets, await asyncio.gather(*(get_collection(target) for target in targets))))
+    for index, query in enumerate(queries):
+        responses[index] = cached_result(query)
+    pending = [index for index, response in enumerate(responses) if response is None]
+
+    # 2. Embed all distinct texts not answered from the cache together, per model.
+    texts_by_model: Dict[str, Dict[str, Any]] = {}
+    for index in pending:
+        query = queries[index]
+        texts_by_model.setdefault(get_pack_model_name(query.target), {})[query.query_text] = None
+    keys = [(model_name, text) for model_name, texts in texts_by_model.items() for text in texts]
+    futures = [
+        future
+        for model_name, texts in texts_by_model.items()
+        for future in get_query_batcher(model_name).submit_many(list(texts))
+    ]
+    vectors = await asyncio.gather(*(asyncio.wrap_future(future) for future in futures))
+    embeddings: Dict[Tuple[str, str], Any] = dict(zip(keys, vectors))
+
+    def embedding_of(index: int):
+        return embeddings[(get_pack_model_name(queries[index].target), queries[index].query_text)]
+
+    # 3. Search each collection once for all of its queries with the same n_results.
+    groups: Dict[Tuple[str, int], List[int]] = {}
+    for index in pending:
+        responses[index] = cached_result(queries[index], embedding_of(index))
+        if responses[index] is None:
+            groups.setdefault((queries[index].target, queries[index].n_results), []).append(index)
+    group_results = await asyncio.gather(*(
+        search(collections[target], [embedding_of(i).tolist() for i in indices], n_results)
+        for (target, n_results), indices in groups.items()
+    ))
+
+    # 4. Put the results back in request order.
+    for indices, results in zip(groups.values(), group_results):
+        for position, index in enumerate(indices):
+            responses[index] = to_response(results, position)
+            cache_result(queries[index], embedding_of(index), responses[index])
+    return BatchQueryResponse(results=responses)
+
+async def admit(run, description: str):
+    """
+    Serves a request unless the server is at capacity, enforcing the request timeout
+    and mapping failures to HTTP errors.
+    """
+    global requests_in_flight
+    if requests_in_flight >= MAX_CONCURRENT_REQUESTS:
+        run.close()
+        raise HTTPException(
+            status_code=503,
+            detail="The server is at capacity. Please retry shortly.",
+            headers={"Retry-After": "1"}
         )
+    requests_in_flight += 1
+    try:
+        return await asyncio.wait_for(run, timeout=REQUEST_TIMEOUT)
 
-    except FileNotFoundError:
+    except asyncio.TimeoutError:
         raise HTTPException(
-            status_code=404, 
-            detail=f"Knowledge pack for target '{request.target}' not found. It may not have been built or has a different name."
+            status_code=504,
+            detail=f"The {description} did not complete within {REQUEST_TIMEOUT} seconds."
         )
+    except PackNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         logging.error(f"An unexpected error occurred: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail="An internal server error occurred.")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="An internal server error occurred.")
+    finally:
+        requests_in_flight -= 1
+
+@app.post("/query", response_model=QueryResponse)
+async def query_knowledge_pack(request: QueryRequest):
+    """
+    Receives a query and a target, loads the corresponding knowledge pack (if not cached),
+    and returns the results from the vector store.
+
+    At most `max_concurrent_requests` requests are served at once; beyond that the API
+    answers 503 immediately instead of queueing. A query that takes longer than
+    `request_timeout` seconds fails with 504 (a pack still loading keeps loading).
+    """
+    logging.info(f"Received query for target: '{request.target}'")
+    return await admit(run_query(request), f"query for target '{request.target}'")
+
+@app.post("/query/batch", response_model=BatchQueryResponse)
+async def query_knowledge_packs_batch(request: BatchQueryRequest):
+    """
+    Answers many queries, across any number of targets, in one request. All query texts
+    are embedded together and each collection is searched once per distinct n_results.
+    Results are returned in the order of the queries. The batch counts as one request
+    against `max_concurrent_requests` and `request_timeout`.
+    """
+    if len(request.queries) > MAX_BATCH_QUERIES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"A batch may hold at most {MAX_BATCH_QUERIES} queries; got {len(request.queries)}."
+        )
+    logging.info(f"Received batch of {len(request.queries)} queries for {len({q.target for q in request.queries})} targets")
+    return await admit(run_batch_query(request), f"batch of {len(request.queries)} queries")
+
+@app.get("/cache/stats")
+async def query_cache_stats():
+    """Hit, miss and eviction counts of the query result cache."""
+    if query_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **query_cache.stats()}
@@ -0,0 +1,133 @@
+# api/query_cache.py
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+# (target, normalized query text, n_results)
+CacheKey = Tuple[str, str, int]
+
+
+@dataclass
+class _Entry:
+    result: Any
+    embedding: Optional[np.ndarray]
+    expires_at: float
+
+
+class QueryCache:
+    """
+    A two-tier cache of query results.
+
+    - The exact tier maps (target, normalized query text, n_results) to the results,
+      so a repeated query skips both embedding and search.
+    - The semantic tier (when `similarity_threshold` > 0) returns the results of a
+      cached query whose embedding has at least that cosine similarity with the new
+      query's, for the same target and n_results. It skips the search.
+
+    Both tiers share one LRU of at most `max_entries` entries, each valid for
+    `ttl_seconds`. The cache lives in the API process, which loads each pack once
+    and serves it until it restarts, so an entry always comes from the collection
+    being served; a rebuilt pack is only picked up by a restart, which empties the
+    cache. The cache is only used from the event loop, so it needs no locking.
+    """
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 600.0, similarity_threshold: float = 0.0):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self._entries: "OrderedDict[CacheKey, _Entry]" = OrderedDict()
+        # (target, n_results) -> keys of its entries with embeddings, and their stacked embeddings
+        self._groups: Dict[Hashable, Dict[CacheKey, None]] = {}
+        self._matrices: Dict[Hashable, Tuple[List[CacheKey], np.ndarray]] = {}
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def normalize(query_text: str) -> str:
+        """Query texts that differ only in case or whitespace share an entry."""
+        return " ".join(query_text.lower().split())
+
+    def get(self, target: str, query_text: str, n_results: int) -> Optional[Any]:
+        """Exact tier lookup. Counts a hit, but not a miss: the semantic tier may still answer."""
+        key = (target, self.normalize(query_text), n_results)
+        entry = self._live_entry(key)
+        if entry is None:
+            return None
+        self._entries.move_to_end(key)
+        self.exact_hits += 1
+        return entry.result
+
+    def get_similar(self, target: str, n_results: int, embedding: np.ndarray) -> Optional[Any]:
+        """Semantic tier lookup, with the query's normalized embedding. Counts a hit or a miss."""
+        if self.similarity_threshold <= 0:
+            self.misses += 1
+            return None
+        group = (target, n_results)
+        keys, matrix = self._matrix(group)
+        if keys:
+            similarities = matrix @ np.asarray(embedding, dtype=np.float32)
+            best = int(np.argmax(similarities))
+            if similarities[best] >= self.similarity_threshold:
+                entry = self._live_entry(keys[best])
+                if entry is not None:
+                    self._entries.move_to_end(keys[best])
+                    self.semantic_hits += 1
+                    return entry.result
+        self.misses += 1
+        return None
+
+    def put(self, target: str, query_text: str, n_results: int, result: Any, embedding: Optional[np.ndarray] = None) -> None:
+        key = (target, self.normalize(query_text), n_results)
+        self._remove(key)
+        self._entries[key] = _Entry(result, embedding, time.monotonic() + self.ttl)
+        if embedding is not None and self.similarity_threshold > 0:
+            group = (target, n_results)
+            self._groups.setdefault(group, {})[key] = None
+            self._matrices.pop(group, None)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.exact_hits + self.semantic_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": (self.exact_hits + self.semantic_hits) / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+    def _live_entry(self, key: CacheKey) -> Optional[_Entry]:
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at <= time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            return None
+        return entry
+
+    def _remove(self, key: CacheKey) -> None:
+        if self._entries.pop(key, None) is None:
+            return
+        group = (key[0], key[2])
+        if key in self._groups.get(group, {}):
+            del self._groups[group][key]
+            if not self._groups[group]:
+                del self._groups[group]
+            self._matrices.pop(group, None)
+
+    def _matrix(self, group: Hashable) -> Tuple[List[CacheKey], np.ndarray]:
+        """The keys of a group's entries and their embeddings stacked as rows, rebuilt only after changes."""
+        if group not in self._matrices:
+            keys = list(self._groups.get(group, ()))
+            matrix = np.stack([self._entries[key].embedding for key in keys]).astype(np.float32) if keys else np.zeros((0, 0), dtype=np.float32)
+            self._matrices[group] = (keys, matrix)
+        return self._matrices[group]
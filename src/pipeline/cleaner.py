@@ -1,7 +1,8 @@
 # pipeline/cleaner.py
 import logging
 import re
-from typing import Dict, List
+from collections import Counter
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
 from bs4 import BeautifulSoup
 from markdown_it import MarkdownIt
@@ -9,8 +10,12 @@ from markdown_it import MarkdownIt
 class EnhancedDataCleaner:
     """
     Sophisticated data cleaner for handling code blocks, boilerplate, and text normalization.
+
+    Besides the fixed boilerplate patterns, it can strip site-specific chrome learned
+    from the whole corpus with `learn_boilerplate` (lines repeated on most pages, such
+    as navigation, search boxes and footers).
     """
-    def __init__(self):
+    def __init__(self, learned_boilerplate: Optional[Iterable[str]] = None):
         self.code_block_pattern = re.compile(r"```.*?```", re.DOTALL)
         self.inline_code_pattern = re.compile(r"`[^`]*`")
         self.boilerplate_patterns = [
@@ -26,17 +31,104 @@ class EnhancedDataCleaner:
         self.extra_whitespace_pattern = re.compile(r"[ \t]+")
         self.extra_newlines_pattern = re.compile(r"\n{3,}")
         self.md = MarkdownIt()
+        self.learned_boilerplate: Set[str] = set(learned_boilerplate or ())
+
+    @staticmethod
+    def _content_lines(markdown_content: str) -> Iterator[Tuple[str, Optional[str]]]:
+        """
+        Yields each line with its normalized form, or None for lines that are never
+        treated as boilerplate: code, headers and lines without any letters or digits.
+        """
+        in_fence = False
+        for line in markdown_content.splitlines():
+            if _FENCE_LINE.match(line):
+                in_fence = not in_fence
+                yield line, None
+            elif in_fence or _HEADER_LINE.match(line) or not any(char.isalnum() for char in line):
+                yield line, None
+            else:
+                yield line, " ".join(line.split())
+
+    @classmethod
+    def learn_boilerplate(
+        cls,
+        documents: Iterable[Dict],
+        min_page_fraction: float = 0.3,
+        min_pages: int = 5,
+        prune_every: int = 1000
+    ) -> List[str]:
+        """
+        Finds lines that repeat across the corpus: those appearing on at least
+        `min_page_fraction` of the pages (and on no fewer than `min_pages` pages).
+        Each page counts a line once, however often it repeats on that page.
+
+        Counting is lossy, so that memory does not grow with the corpus: every
+        `prune_every` pages, lines seen on no more than one page per `prune_every`
+        so far are forgotten. A line's count is then short by at most
+        pages / `prune_every`, far below the threshold.
+        """
+        line_pages: Counter = Counter()
+        pages = 0
+        for doc in documents:
+            markdown_content = doc.get("markdown")
+            if not markdown_content:
+                continue
+            pages += 1
+            line_pages.update({normalized for _, normalized in cls._content_lines(markdown_content) if normalized})
+            if pages % prune_every == 0:
+                floor = pages // prune_every
+                for line in [line for line, count in line_pages.items() if count <= floor]:
+                    del line_pages[line]
+
+        threshold = max(min_pages, min_page_fraction * pages)
+        learned = sorted(line for line, count in line_pages.items() if count >= threshold)
+        logging.info("Learned %d boilerplate lines from %d pages.", len(learned), pages)
+        return learned
+
+    def strip_boilerplate(self, markdown_content: str) -> str:
+        """Removes the learned boilerplate lines from a markdown document."""
+        if not self.learned_boilerplate:
+            return markdown_content
+        return "\n".join(
+            line for line, normalized in self._content_lines(markdown_content)
+            if normalized not in self.learned_boilerplate
+        )
 
     def _remove_html_and_markdown(self, text: str) -> str:
+        """
+        Reduces markdown to its plain text by walking markdown-it's token stream, keeping
+        what a browser would display as text (no link targets, image alt text or tags).
+        """
         try:
             text = self.markdown_link_pattern.sub(r"\1", text)
-            html = self.md.render(text)
-            soup = BeautifulSoup(html, "html.parser")
-            return soup.get_text()
+            parts: List[str] = []
+            for token in self.md.parse(text):
+                if token.type == "inline":
+                    for child in token.children or ():
+                        if child.type in ("text", "code_inline"):
+                            parts.append(child.content)
+                        elif child.type in ("softbreak", "hardbreak"):
+                            parts.append("\n")
+                elif token.type in ("fence", "code_block"):
+                    parts.append(token.content)
+                elif token.type == "html_block":
+                    # Raw HTML is rare in scraped markdown; only here is a parser still needed
+                    parts.append(BeautifulSoup(token.content, "html.parser").get_text())
+                if token.block and token.nesting <= 0 and token.type != "inline":
+                    parts.append("\n")
+            return "".join(parts)
         except Exception as e:
             logging.error("Error removing HTML/Markdown: %s", e)
             return text
 
+    def _remove_html_and_markdown_via_html(self, text: str) -> str:
+        """
+        The previous implementation: renders to HTML and parses it back. Kept as the
+        reference for benchmarks/cleaner_benchmark.py.
+        """
+        text = self.markdown_link_pattern.sub(r"\1", text)
+        return BeautifulSoup(self.md.render(text), "html.parser").get_text()
+
     def clean(self, markdown_content: str) -> str:
         if not isinstance(markdown_content, str):
             logging.warning("Markdown content was not a string. Returning empty.")
@@ -73,4 +165,252 @@ def chunk_document_by_headers(markdown_content: str) -> List[Dict[str, str]]:
     if not chunks and markdown_content:
         chunks.append({"header": "General", "content": markdown_content})
 
-    return chunks
\ No newline at end of file
+    return chunks
+
+# Counts model tokens for a batch of texts (e.g. `EmbeddingBackend.count_tokens`).
+TokenCounter = Callable[[List[str]], List[int]]
+
+_HEADER_LINE = re.compile(r"^(#{1,6})\s+(.*)")
+_FENCE_LINE = re.compile(r"^\s*(```|~~~)")
+_SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+")
+_TAIL_BREAK = re.compile(r"(?<=[.!?])\s+|\n+")
+
+def _split_sections(markdown_content: str) -> List[Dict[str, str]]:
+    """Splits markdown at headers outside code fences, keeping each header line."""
+    sections = [{"header": "Introduction", "heading": "", "lines": []}]
+    in_fence = False
+    for line in markdown_content.splitlines():
+        if _FENCE_LINE.match(line):
+            in_fence = not in_fence
+        match = None if in_fence else _HEADER_LINE.match(line)
+        if match:
+            sections.append({"header": match.group(2).strip(), "heading": line.strip(), "lines": []})
+        else:
+            sections[-1]["lines"].append(line)
+
+    result = [
+        {"header": section["header"], "heading": section["heading"], "content": "\n".join(section["lines"]).strip()}
+        for section in sections
+    ]
+    if not result[0]["content"]:
+        result.pop(0)
+    elif len(result) == 1:
+        result[0]["header"] = "General"
+    return result
+
+def _split_paragraphs(text: str) -> List[str]:
+    """Splits text at blank lines, keeping fenced code blocks whole."""
+    paragraphs, current = [], []
+    in_fence = False
+    for line in text.splitlines():
+        if _FENCE_LINE.match(line):
+            in_fence = not in_fence
+        if not line.strip() and not in_fence:
+            if current:
+                paragraphs.append("\n".join(current))
+                current = []
+        else:
+            current.append(line)
+    if current:
+        paragraphs.append("\n".join(current))
+    return paragraphs
+
+def _split_lines(text: str) -> List[str]:
+    """Splits text into lines, keeping each fenced code block together as one part."""
+    parts: List[str] = []
+    block: List[str] = []
+    for line in text.splitlines():
+        if block:
+            block.append(line)
+            if _FENCE_LINE.match(line):
+                parts.append("\n".join(block))
+                block = []
+        elif _FENCE_LINE.match(line):
+            block = [line]
+        else:
+            parts.append(line)
+    if block:
+        parts.append("\n".join(block))
+    return parts
+
+def _fit_units(text: str, tokens: int, budget: int, count_tokens: TokenCounter, special: int) -> List[Tuple[str, int]]:
+    """
+    Returns `text` as (unit, tokens) pairs no longer than `budget` tokens, splitting
+    oversized text by lines (keeping code blocks together), then sentences, then words.
+    """
+    if tokens <= budget:
+        return [(text, tokens)]
+    lines = text.splitlines()
+    if len(lines) > 1 and _FENCE_LINE.match(lines[0]) and len(_split_lines(text)) == 1:
+        return _fit_code_block(lines, budget, count_tokens, special)
+    for splitter, joiner in ((_split_lines, "\n"), (_SENTENCE_BREAK.split, " "), (str.split, " ")):
+        parts = [part for part in splitter(text) if part.strip()]
+        if len(parts) > 1:
+            break
+    else:
+        # A single word longer than the budget; the model truncates it anyway
+        return [(text, budget)]
+    counts = [count - special for count in count_tokens(parts)]
+    units = []
+    for part, count in zip(parts, counts):
+        units.extend(_fit_units(part, count, budget, count_tokens, special))
+    return _pack_units(units, budget, joiner)
+
+def _fit_code_block(lines: List[str], budget: int, count_tokens: TokenCounter, special: int) -> List[Tuple[str, int]]:
+    """
+    Splits an oversized fenced code block by lines. Each piece is closed and the next
+    reopened with the same fence line, so that every piece is a complete block, which
+    `EnhancedDataCleaner.clean` strips like any other.
+    """
+    opening = lines[0]
+    if _FENCE_LINE.match(lines[-1]):
+        closing, body = lines[-1], lines[1:-1]
+    else:
+        # An unclosed block runs to the end of the section
+        closing, body = _FENCE_LINE.match(opening).group(1), lines[1:]
+    fence_tokens = count_tokens([f"{opening}\n{closing}"])[0] - special
+    inner = max(1, budget - fence_tokens)
+    units = []
+    for line, count in zip(body, count_tokens(body) if body else []):
+        units.extend(_fit_units(line, count - special, inner, count_tokens, special))
+    return [
+        (f"{opening}\n{text}\n{closing}", tokens + fence_tokens)
+        for text, tokens in _pack_units(units, inner, "\n")
+    ]
+
+def _pack_units(units: List[Tuple[str, int]], budget: int, joiner: str = "\n\n") -> List[Tuple[str, int]]:
+    """Greedily packs units into pieces of at most `budget` tokens."""
+    pieces = []
+    current: List[str] = []
+    total = 0
+    for text, tokens in units:
+        if current and total + tokens > budget:
+            pieces.append((joiner.join(current), total))
+            current, total = [], 0
+        current.append(text)
+        total += tokens
+    if current:
+        pieces.append((joiner.join(current), total))
+    return pieces
+
+def _tail(text: str, overlap: int, count_tokens: TokenCounter, special: int) -> Tuple[str, int]:
+    """
+    Returns the trailing sentences of `text` that fit in `overlap` tokens or, when its
+    last sentence is longer than that, its trailing words. Stops at code fences, so
+    that a repeated tail never opens a code block in the next piece.
+    """
+    starts = [0] + [match.end() for match in _TAIL_BREAK.finditer(text)]
+    spans = [(start, text[start:end].strip()) for start, end in zip(starts, starts[1:] + [len(text)])]
+    spans = [(start, sentence) for start, sentence in spans if sentence]
+    if overlap <= 0 or not spans:
+        return "", 0
+    counts = [count - special for count in count_tokens([sentence for _, sentence in spans])]
+    tail_start, total = len(text), 0
+    for (start, sentence), count in zip(reversed(spans), reversed(counts)):
+        if total + count > overlap or _FENCE_LINE.match(sentence):
+            break
+        tail_start, total = start, total + count
+    if total:
+        return text[tail_start:].strip(), total
+    if _FENCE_LINE.match(spans[-1][1]):
+        return "", 0
+    # Every word has at least one token, so the last `overlap` words are enough
+    words = spans[-1][1].split()[-overlap:]
+    tail: List[str] = []
+    for word, count in zip(reversed(words), reversed(count_tokens(words))):
+        if total + count - special > overlap:
+            break
+        tail.insert(0, word)
+        total += count - special
+    return " ".join(tail), total
+
+def _overlap_pieces(
+    pieces: List[Tuple[str, int]], overlap: int, count_tokens: TokenCounter, special: int
+) -> List[Tuple[str, int]]:
+    """Starts each piece after the first with the tail of the previous one, up to `overlap` tokens."""
+    result = pieces[:1]
+    for previous, (text, tokens) in zip(pieces, pieces[1:]):
+        tail, tail_tokens = _tail(previous[0], overlap, count_tokens, special)
+        result.append((f"{tail}\n{text}", tail_tokens + tokens) if tail else (text, tokens))
+    return result
+
+def _merge_chunk(target: Dict, chunk: Dict, budget: int, count_tokens: TokenCounter, special: int) -> bool:
+    """
+    Appends `chunk` to `target` if the result fits in `budget`. Once merged, a chunk's
+    content starts with its own header line, so every section keeps its header for
+    context. The merged chunk takes the header of the section supplying most of its tokens.
+    """
+    parts = [
+        "\n".join(part for part in (c["heading"], c["content"]) if part)
+        for c in (target, chunk)
+    ]
+    content = "\n\n".join(part for part in parts if part)
+    tokens = count_tokens([content])[0] - special
+    if tokens > budget:
+        return False
+    target["content"] = content
+    target["tokens"] = tokens
+    # Its header line is now part of the content
+    target["heading"] = ""
+    for header, header_tokens in chunk["sources"].items():
+        target["sources"][header] = target["sources"].get(header, 0) + header_tokens
+    # max() keeps the earliest header on a tie
+    target["header"] = max(target["sources"], key=target["sources"].get)
+    return True
+
+def chunk_document_by_tokens(
+    markdown_content: str,
+    count_tokens: TokenCounter,
+    max_tokens: int = 256,
+    min_tokens: int = 32,
+    overlap_tokens: int = 32
+) -> List[Dict[str, str]]:
+    """
+    Splits a markdown document at its headers, then fits the chunks to a token budget
+    measured with the embedding model's tokenizer:
+
+    - Sections longer than `max_tokens` are split at paragraphs (then lines, sentences
+      and words), so nothing is lost to the model's truncation. Each piece starts with
+      the last sentences (or words) of the previous one, up to `overlap_tokens`. An
+      oversized code block is split into several complete (fenced) blocks.
+    - Sections shorter than `min_tokens` (e.g. a lone header) are merged into the next
+      section, or the previous one, when the result still fits. A merged chunk keeps
+      the header of the section supplying most of its content.
+
+    Returns chunks in the same shape as `chunk_document_by_headers`.
+    """
+    special = count_tokens([""])[0]
+    budget = max(1, max_tokens - special)
+    # Pieces are packed short enough to still fit in the budget with the overlap added
+    overlap = max(0, min(overlap_tokens, budget // 2))
+    capacity = budget - overlap
+    sections = _split_sections(markdown_content)
+
+    chunks = []
+    for section in sections:
+        paragraphs = _split_paragraphs(section["content"])
+        counts = [count - special for count in count_tokens(paragraphs)] if paragraphs else []
+        units = []
+        for paragraph, count in zip(paragraphs, counts):
+            units.extend(_fit_units(paragraph, count, capacity, count_tokens, special))
+        pieces = _overlap_pieces(_pack_units(units, capacity), overlap, count_tokens, special) or [("", 0)]
+        for text, tokens in pieces:
+            chunks.append({
+                "header": section["header"],
+                "heading": section["heading"],
+                "content": text,
+                "tokens": tokens,
+                "sources": {section["header"]: tokens},
+            })
+
+    # Fold short chunks into the following chunk, then any still short into the preceding one
+    merged: List[Dict] = []
+    for chunk in chunks:
+        if not (merged and merged[-1]["tokens"] < min_tokens and _merge_chunk(merged[-1], chunk, budget, count_tokens, special)):
+            merged.append(chunk)
+    result: List[Dict] = []
+    for chunk in merged:
+        if not (result and chunk["tokens"] < min_tokens and _merge_chunk(result[-1], chunk, budget, count_tokens, special)):
+            result.append(chunk)
+
+    return [{"header": chunk["header"], "content": chunk["content"]} for chunk in result if chunk["content"]]
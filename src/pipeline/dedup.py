@@ -0,0 +1,111 @@
+# pipeline/dedup.py
+import hashlib
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+DEDUP_MODES = ("off", "exact", "near")
+
+# A prime just above 2**32, so (a * h + b) stays within uint64 for 32-bit a, b and h.
+_PRIME = np.uint64(4294967311)
+_MAX_HASH = np.uint64(0xFFFFFFFF)
+
+
+def _shingle_hashes(text: str, size: int) -> np.ndarray:
+    """32-bit hashes of the word `size`-grams of a text."""
+    words = text.split()
+    shingles = {" ".join(words[i:i + size]) for i in range(max(1, len(words) - size + 1))}
+    return np.array(
+        [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little") for s in shingles],
+        dtype=np.uint64
+    )
+
+
+class ChunkDeduplicator:
+    """
+    Finds chunks whose cleaned text repeats an earlier chunk: exactly (same text hash)
+    or, in "near" mode, approximately (MinHash signatures over word shingles, with LSH
+    banding to find candidates and the estimated Jaccard similarity to confirm them).
+
+    The first chunk seen with a given text is the representative; later duplicates
+    map to it. Only signatures and band keys of representatives are kept in memory.
+    """
+    def __init__(
+        self,
+        mode: str = "near",
+        threshold: float = 0.9,
+        num_perm: int = 128,
+        bands: int = 16,
+        shingle_size: int = 3,
+        min_shingles: int = 8
+    ):
+        if mode not in DEDUP_MODES:
+            raise ValueError(f"Unknown dedup mode '{mode}'. Use one of: {', '.join(DEDUP_MODES)}.")
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands.")
+        self.mode = mode
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        # Very short texts have too few shingles for a meaningful similarity; only exact matches count
+        self.min_shingles = min_shingles
+
+        # Fixed seed: the same text always gets the same signature, across runs
+        generator = np.random.RandomState(1)
+        self._a = generator.randint(1, 2 ** 32, size=num_perm, dtype=np.uint64)
+        self._b = generator.randint(0, 2 ** 32, size=num_perm, dtype=np.uint64)
+
+        # representative text hash -> (chunk id, source url)
+        self._exact: Dict[str, Tuple[str, str]] = {}
+        self._signatures: List[np.ndarray] = []
+        self._representatives: List[Tuple[str, str]] = []
+        self._buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(bands)]
+        self.exact_duplicates = 0
+        self.near_duplicates = 0
+
+    def _signature(self, text: str) -> Optional[np.ndarray]:
+        hashes = _shingle_hashes(text, self.shingle_size)
+        if len(hashes) < self.min_shingles:
+            return None
+        permuted = (np.outer(hashes, self._a) + self._b) % _PRIME & _MAX_HASH
+        return permuted.min(axis=0).astype(np.uint32)
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+
+    def check(self, text_hash: str, text: str, chunk_id: str, source_url: str) -> Optional[Tuple[str, str]]:
+        """
+        Returns the (chunk id, source url) of the representative `text` duplicates, or
+        None if it is new, in which case the chunk becomes a representative itself.
+        """
+        if self.mode == "off":
+            return None
+        if text_hash in self._exact:
+            self.exact_duplicates += 1
+            return self._exact[text_hash]
+        representative = (chunk_id, source_url)
+        self._exact[text_hash] = representative
+        if self.mode != "near":
+            return None
+
+        signature = self._signature(text)
+        if signature is None:
+            return None
+        keys = self._band_keys(signature)
+        candidates: Set[int] = set()
+        for band, key in enumerate(keys):
+            candidates.update(self._buckets[band].get(key, ()))
+        for candidate in sorted(candidates):
+            if np.mean(self._signatures[candidate] == signature) >= self.threshold:
+                self.near_duplicates += 1
+                # Later exact copies of this text map to the same representative
+                self._exact[text_hash] = self._representatives[candidate]
+                return self._representatives[candidate]
+
+        index = len(self._signatures)
+        self._signatures.append(signature)
+        self._representatives.append(representative)
+        for band, key in enumerate(keys):
+            self._buckets[band].setdefault(key, []).append(index)
+        return None
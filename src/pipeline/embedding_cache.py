@@ -0,0 +1,71 @@
+# pipeline/embedding_cache.py
+import hashlib
+import logging
+import os
+import sqlite3
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+# SQLite limits the number of bound parameters per statement; stay well below it.
+_QUERY_BATCH_SIZE = 500
+
+
+def text_hash(text: str) -> str:
+    """The content address of a cleaned chunk text."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    A persistent, content-addressed store of embeddings, keyed by (model name, hash of
+    the cleaned text). Rebuilding a pack only has to encode the texts that changed since
+    the last build; everything else is read back from disk.
+
+    Vectors are stored as float32 exactly as the model produced them (normalized), so a
+    cached vector is interchangeable with a freshly encoded one.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # process_and_embed encodes on a worker thread; it is the only thread using the cache
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL,"
+            " text_hash TEXT NOT NULL,"
+            " vector BLOB NOT NULL,"
+            " PRIMARY KEY (model, text_hash))"
+        )
+        self._conn.commit()
+
+    def get_many(self, model_name: str, hashes: Iterable[str]) -> Dict[str, np.ndarray]:
+        """Returns the cached vectors among `hashes`, keyed by hash. Misses are simply absent."""
+        hashes = list(dict.fromkeys(hashes))
+        found: Dict[str, np.ndarray] = {}
+        for start in range(0, len(hashes), _QUERY_BATCH_SIZE):
+            batch = hashes[start:start + _QUERY_BATCH_SIZE]
+            rows = self._conn.execute(
+                f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({','.join('?' * len(batch))})",
+                [model_name, *batch]
+            )
+            for key, blob in rows:
+                found[key] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def put_many(self, model_name: str, items: Iterable[Tuple[str, np.ndarray]]) -> None:
+        """Stores (hash, vector) pairs for `model_name`, replacing any existing entries."""
+        rows: List[Tuple[str, str, bytes]] = [
+            (model_name, key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items
+        ]
+        if not rows:
+            return
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector) VALUES (?, ?, ?)", rows
+            )
+        logging.info("Stored %d new embeddings in %s.", len(rows), self.path)
+
+    def close(self) -> None:
+        self._conn.close()
@@ -0,0 +1,302 @@
+# pipeline/embeddings.py
+import copy
+import inspect
+import json
+import logging
+import os
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+# The torch backend needs sentence-transformers (and torch). The ONNX backend only
+# needs onnxruntime and tokenizers, so the API can serve queries without torch.
+try:
+    from sentence_transformers import SentenceTransformer
+    SENTENCE_TRANSFORMERS_AVAILABLE = True
+except ImportError:
+    SENTENCE_TRANSFORMERS_AVAILABLE = False
+
+try:
+    import onnxruntime
+    from tokenizers import Tokenizer
+    ONNXRUNTIME_AVAILABLE = True
+except ImportError:
+    ONNXRUNTIME_AVAILABLE = False
+
+BACKENDS = ("torch", "onnx")
+
+# Sentences used to check that an exported model embeds like the original.
+PARITY_SENTENCES = [
+    "How do I install the package?",
+    "Create a client and pass your API key as an environment variable.",
+    "def chunk(text: str, size: int) -> list[str]: return [text[i:i + size] for i in range(0, len(text), size)]",
+    "The retriever returns the top k documents ranked by cosine similarity to the query embedding.",
+    "Error: connection refused",
+]
+# Minimum cosine similarity between torch and ONNX embeddings of the same sentence.
+PARITY_THRESHOLD = 0.99
+
+
+class EmbeddingBackend(ABC):
+    """Turns texts into normalized float32 embeddings with a particular model and runtime."""
+    model_name: str
+    max_seq_length: int
+
+    @property
+    def cache_key(self) -> str:
+        """Identifies the vectors this backend produces, e.g. for the embedding cache."""
+        return self.model_name
+
+    @abstractmethod
+    def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        """Encodes `texts` into an (n, dim) array of L2-normalized embeddings."""
+        pass
+
+    @abstractmethod
+    def count_tokens(self, texts: List[str]) -> List[int]:
+        """Returns the number of model tokens in each text, special tokens included, before truncation."""
+        pass
+
+    def token_counter(self) -> Callable[[List[str]], List[int]]:
+        """
+        Returns a callable equivalent to `count_tokens` that only holds the tokenizer, so
+        it can be sent to worker processes without the model.
+        """
+        return self.count_tokens
+
+
+class _TransformersTokenCounter:
+    """Counts tokens with a Hugging Face transformers tokenizer."""
+    def __init__(self, tokenizer):
+        self.tokenizer = tokenizer
+
+    def __call__(self, texts: List[str]) -> List[int]:
+        return [len(ids) for ids in self.tokenizer(texts, truncation=False, verbose=False)["input_ids"]]
+
+
+class _TokenizersTokenCounter:
+    """Counts tokens with a `tokenizers` Tokenizer that neither pads nor truncates."""
+    def __init__(self, tokenizer):
+        self.tokenizer = tokenizer
+
+    def __call__(self, texts: List[str]) -> List[int]:
+        return [len(encoding.ids) for encoding in self.tokenizer.encode_batch(texts)]
+
+
+class SentenceTransformerBackend(EmbeddingBackend):
+    """Runs the model with sentence-transformers on PyTorch."""
+    def __init__(self, model_name: str, cache_folder: Optional[str] = None):
+        if not SENTENCE_TRANSFORMERS_AVAILABLE:
+            raise ImportError("Please install `sentence-transformers` to use the torch embedding backend.")
+        self.model_name = model_name
+        self.model = SentenceTransformer(model_name, cache_folder=cache_folder)
+        self.max_seq_length = self.model.max_seq_length
+        # Fast tokenizers keep padding and truncation settings as mutable state, so
+        # counting (while chunking) must not share the tokenizer the encoder thread uses
+        self._token_counter = _TransformersTokenCounter(copy.deepcopy(self.model.tokenizer))
+
+    def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        return self.model.encode(
+            texts,
+            batch_size=batch_size,
+            show_progress_bar=False,
+            normalize_embeddings=True # Important for cosine similarity
+        )
+
+    def count_tokens(self, texts: List[str]) -> List[int]:
+        return self._token_counter(texts)
+
+    def token_counter(self) -> Callable[[List[str]], List[int]]:
+        return self._token_counter
+
+
+class OnnxBackend(EmbeddingBackend):
+    """
+    Runs a model exported with `export_onnx` on ONNX Runtime: tokenization with
+    `tokenizers`, the transformer in ONNX, and pooling and normalization in numpy.
+    """
+    def __init__(self, model_dir: str, quantized: bool = False):
+        if not ONNXRUNTIME_AVAILABLE:
+            raise ImportError("Please install `onnxruntime` and `tokenizers` to use the ONNX embedding backend.")
+        with open(os.path.join(model_dir, "backend.json"), "r", encoding="utf-8") as f:
+            self.config: Dict[str, Any] = json.load(f)
+        self.model_name = self.config["model_name"]
+        self.max_seq_length = self.config["max_seq_length"]
+        self.quantized = quantized
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=self.max_seq_length)
+        self.tokenizer.enable_padding(pad_id=self.config["pad_token_id"], pad_token=self.config["pad_token"])
+        # A second instance without padding or truncation, for counting tokens
+        counter = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        counter.no_padding()
+        counter.no_truncation()
+        self._token_counter = _TokenizersTokenCounter(counter)
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        model_file = "model_int8.onnx" if quantized else "model.onnx"
+        self.session = onnxruntime.InferenceSession(
+            os.path.join(model_dir, model_file), options, providers=["CPUExecutionProvider"]
+        )
+        self._input_names = {model_input.name for model_input in self.session.get_inputs()}
+
+    @property
+    def cache_key(self) -> str:
+        return f"{self.model_name}:onnx-int8" if self.quantized else f"{self.model_name}:onnx"
+
+    def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        batches = [self._encode_batch(texts[start:start + batch_size]) for start in range(0, len(texts), batch_size)]
+        if not batches:
+            return np.zeros((0, self.config["dimension"]), dtype=np.float32)
+        return np.concatenate(batches)
+
+    def count_tokens(self, texts: List[str]) -> List[int]:
+        return self._token_counter(texts)
+
+    def token_counter(self) -> Callable[[List[str]], List[int]]:
+        return self._token_counter
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        inputs = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        hidden = self.session.run(None, {name: value for name, value in inputs.items() if name in self._input_names})[0]
+
+        if self.config["pooling"] == "cls":
+            pooled = hidden[:, 0]
+        else:
+            mask = inputs["attention_mask"][:, :, None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        pooled = pooled.astype(np.float32)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+
+def onnx_model_dir(model_name: str, cache_folder: Optional[str] = None) -> str:
+    """Where the ONNX export of `model_name` is stored."""
+    cache_folder = cache_folder or os.environ.get(
+        "SENTENCE_TRANSFORMERS_HOME", os.path.expanduser("~/.cache/torch/sentence_transformers")
+    )
+    return os.path.join(cache_folder, "onnx", model_name.replace("/", "__"))
+
+
+def _pooling_mode(pooling_config: Dict[str, Any]) -> Optional[str]:
+    """Reads the pooling mode from a Pooling module's config, across sentence-transformers versions."""
+    if "pooling_mode" in pooling_config:
+        return pooling_config["pooling_mode"]
+    enabled = [key for key, value in pooling_config.items() if key.startswith("pooling_mode_") and value]
+    if enabled == ["pooling_mode_mean_tokens"]:
+        return "mean"
+    if enabled == ["pooling_mode_cls_token"]:
+        return "cls"
+    return None
+
+
+def export_onnx(model_name: str, cache_folder: Optional[str] = None, quantize: bool = False) -> str:
+    """
+    Exports a sentence-transformers model to ONNX (and, with `quantize`, a dynamically
+    int8-quantized copy) so it can be served without torch. Needs torch and
+    sentence-transformers, so it runs at build time (see precache_models.py).
+
+    Returns:
+        The directory holding the exported model.
+    """
+    import torch
+    from sentence_transformers.models import Pooling
+
+    model = SentenceTransformer(model_name, cache_folder=cache_folder)
+    transformer = model[0].auto_model.eval()
+    tokenizer = model.tokenizer
+    pooling = next((module for module in model if isinstance(module, Pooling)), None)
+    pooling_mode = _pooling_mode(pooling.get_config_dict()) if pooling is not None else "mean"
+    if pooling_mode not in ("mean", "cls"):
+        raise ValueError(f"Model '{model_name}' uses a pooling mode the ONNX backend does not support.")
+
+    output_dir = onnx_model_dir(model_name, cache_folder)
+    os.makedirs(output_dir, exist_ok=True)
+
+    class _LastHiddenState(torch.nn.Module):
+        """Exposes the transformer's token embeddings as a single positional-input output."""
+        def __init__(self, module, input_names):
+            super().__init__()
+            self.module = module
+            self.input_names = input_names
+
+        def forward(self, *args):
+            return self.module(**dict(zip(self.input_names, args)))[0]
+
+    sample = tokenizer(["An example sentence to trace the model."], return_tensors="pt")
+    input_names = list(sample.keys())
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+    model_path = os.path.join(output_dir, "model.onnx")
+    # Newer torch defaults to the dynamo exporter, which needs onnxscript; the TorchScript
+    # exporter handles these models fine and works across torch versions
+    export_options = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+    with torch.no_grad():
+        torch.onnx.export(
+            _LastHiddenState(transformer, input_names),
+            tuple(sample[name] for name in input_names),
+            model_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=14,
+            **export_options,
+        )
+    logging.info("Exported '%s' to %s.", model_name, model_path)
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(model_path, os.path.join(output_dir, "model_int8.onnx"), weight_type=QuantType.QInt8)
+        logging.info("Wrote int8-quantized copy of '%s'.", model_name)
+
+    tokenizer.save_pretrained(output_dir)
+    with open(os.path.join(output_dir, "backend.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "model_name": model_name,
+            "max_seq_length": model.max_seq_length,
+            "dimension": model.get_sentence_embedding_dimension(),
+            "pooling": pooling_mode,
+            "pad_token": tokenizer.pad_token,
+            "pad_token_id": tokenizer.pad_token_id,
+        }, f, indent=2)
+    return output_dir
+
+
+def check_parity(reference: EmbeddingBackend, candidate: EmbeddingBackend, texts: Optional[List[str]] = None) -> float:
+    """Returns the lowest cosine similarity between the two backends' embeddings of `texts`."""
+    texts = texts or PARITY_SENTENCES
+    similarities = (reference.encode(texts) * candidate.encode(texts)).sum(axis=1)
+    return float(similarities.min())
+
+
+def load_embedding_backend(
+    model_name: str,
+    backend: str = "torch",
+    quantize: bool = False,
+    cache_folder: Optional[str] = None
+) -> EmbeddingBackend:
+    """
+    Loads `model_name` with the given backend ("torch" or "onnx"). The ONNX backend uses
+    the export made by precache_models.py, exporting on the fly if torch is available.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{backend}'. Use one of: {', '.join(BACKENDS)}.")
+    if backend == "torch":
+        return SentenceTransformerBackend(model_name, cache_folder=cache_folder)
+
+    model_dir = onnx_model_dir(model_name, cache_folder)
+    model_file = os.path.join(model_dir, "model_int8.onnx" if quantize else "model.onnx")
+    if not os.path.exists(model_file):
+        if not SENTENCE_TRANSFORMERS_AVAILABLE:
+            raise FileNotFoundError(
+                f"No ONNX export of '{model_name}' at {model_dir}. Run precache_models.py to create it."
+            )
+        logging.warning("No ONNX export of '%s' found. Exporting it now.", model_name)
+        export_onnx(model_name, cache_folder=cache_folder, quantize=quantize)
+    return OnnxBackend(model_dir, quantized=quantize)
@@ -13,15 +13,31 @@ logging.basicConfig(
 )
 
 # --- Import pipeline modules ---
+from pipeline.cleaner import EnhancedDataCleaner
 from pipeline.config import load_config
-from pipeline.scraper import scrape_documentation
-from pipeline.storage import save_to_cache, load_from_cache
+from pipeline.scraper import UrlCanonicalizer, scrape_documentation
+from pipeline.storage import (
+    CrawlCheckpoint, cache_path_for, find_cache_file, iter_cache, load_from_cache, save_to_cache
+)
 # Switch from graph_creator to vector_processor
+from pipeline.embedding_cache import EmbeddingCache
 from pipeline.vector_processor import process_and_embed
 
 # --- Stage 1: Scraping and Caching ---
-def scrape_and_cache_target(target_name: str, config: Dict[str, Any], force: bool = False):
-    """Handles the scraping and caching stage for a specific target."""
+def scrape_and_cache_target(
+    target_name: str,
+    config: Dict[str, Any],
+    force: bool = False,
+    incremental: bool = False,
+    resume: bool = False
+):
+    """
+    Handles the scraping and caching stage for a specific target.
+    With `incremental`, an existing cache is refreshed with conditional requests,
+    reusing the cached markdown of pages the server reports as unchanged.
+    Progress is checkpointed as the crawl runs; with `resume`, an interrupted
+    crawl continues from its last checkpoint.
+    """
     logging.info("--- Starting Scrape Stage for Target: %s ---", target_name)
     target_config = config.get("targets", {}).get(target_name)
     if not target_config:
@@ -30,20 +46,59 @@ def scrape_and_cache_target(target_name: str, config: Dict[str, Any], force: boo
 
     pipeline_config = config.get("pipeline", {})
     cache_dir = pipeline_config.get("cache_dir", ".cache")
-    cache_file = os.path.join(cache_dir, f"{target_name}_scrape_data.json")
-
-    if os.path.exists(cache_file) and not force:
-        logging.info("Cache file already exists for '%s'. Use --force to re-scrape. Skipping.", target_name)
+    cache_file = cache_path_for(cache_dir, target_name, pipeline_config.get("cache_format", "jsonl"))
+    existing_cache = find_cache_file(cache_dir, target_name)
+
+    previous_docs = None
+    if incremental:
+        previous_docs = load_from_cache(existing_cache) if existing_cache else []
+        logging.info("Incremental scrape: revalidating %d cached pages.", len(previous_docs))
+    elif existing_cache and not (force or resume):
+        logging.info(
+            "Cache file already exists for '%s'. Use --force to re-scrape or --incremental to refresh. Skipping.",
+            target_name
+        )
         return
 
     page_limit = target_config.get("page_limit", 1000)
     target_url = target_config.get("url")
+    checkpoint = CrawlCheckpoint(
+        os.path.join(cache_dir, f"{target_name}_scrape"),
+        interval=pipeline_config.get("checkpoint_interval", 50),
+        resume=resume
+    )
 
-    scraped_docs = scrape_documentation(url=target_url, limit=page_limit)
+    scraped_docs = scrape_documentation(
+        url=target_url,
+        limit=page_limit,
+        engine=target_config.get("engine", "hrequests"),
+        max_concurrency=target_config.get("max_concurrency", 16),
+        max_per_host=target_config.get("max_per_host", 8),
+        extraction_workers=target_config.get("extraction_workers", 0),
+        canonicalizer=UrlCanonicalizer(**target_config.get("canonicalize", {})),
+        discovery=target_config.get("discovery", "links"),
+        sitemap_url=target_config.get("sitemap_url"),
+        previous_records=previous_docs,
+        checkpoint=checkpoint,
+        min_delay=target_config.get("min_delay", 0.0),
+        max_retries=target_config.get("max_retries", 3)
+    )
     if scraped_docs:
-        save_to_cache(scraped_docs, cache_file)
+        if not save_to_cache(scraped_docs, cache_file):
+            # Keep the checkpoint: it holds the only copy of the crawl
+            checkpoint.mark_complete()
+            checkpoint.close()
+            logging.error(
+                "Could not write the cache for '%s'. The crawl is kept in its checkpoint; "
+                "fix the problem and run `scrape %s --resume` to save it.", target_name, target_name
+            )
+            return
+        # A cache left over in another format would otherwise shadow or duplicate the new one
+        if existing_cache and existing_cache != cache_file and os.path.exists(cache_file):
+            os.remove(existing_cache)
     else:
         logging.warning("Scraping returned no documents for '%s'. Nothing to cache.", target_name)
+    checkpoint.discard()
 
 # --- Stage 2: Vector Processing from Cache ---
 def process_target_from_cache(target_name: str, config: Dict[str, Any]):
@@ -56,22 +111,54 @@ def process_target_from_cache(target_name: str, config: Dict[str, Any]):
     vector_store_config = config.get("vector_store", {})
     cache_dir = pipeline_config.get("cache_dir", ".cache")
     output_dir = pipeline_config.get("output_dir", "repository")
-    cache_file = os.path.join(cache_dir, f"{target_name}_scrape_data.json")
+    cache_file = find_cache_file(cache_dir, target_name)
 
-    # Load data exclusively from the cache
-    docs_from_cache = load_from_cache(cache_file)
-    if not docs_from_cache:
+    # Load data exclusively from the cache, streaming one document at a time
+    if not cache_file:
         logging.error("No cache file found for '%s'. Please run the 'scrape' command first.", target_name)
         return
+    docs_from_cache = iter_cache(cache_file)
+
+    # A first pass over the cache finds chrome repeated across the site's pages
+    boilerplate = None
+    if vector_store_config.get("learn_boilerplate", True):
+        boilerplate = EnhancedDataCleaner.learn_boilerplate(
+            iter_cache(cache_file),
+            min_page_fraction=vector_store_config.get("boilerplate_min_page_fraction", 0.3),
+            min_pages=vector_store_config.get("boilerplate_min_pages", 5)
+        )
 
     # Call the vector processor
     embedding_model = vector_store_config.get("embedding_model_name", "all-MiniLM-L6-v2")
-    process_and_embed(
-        documents=docs_from_cache,
-        output_dir=output_dir,
-        target_name=target_name,
-        model_name=embedding_model
-    )
+    embedding_cache = None
+    if vector_store_config.get("embedding_cache", True):
+        embedding_cache = EmbeddingCache(os.path.join(cache_dir, "embeddings.sqlite"))
+    try:
+        process_and_embed(
+            documents=docs_from_cache,
+            output_dir=output_dir,
+            target_name=target_name,
+            model_name=embedding_model,
+            embedding_cache=embedding_cache,
+            sync=vector_store_config.get("sync", True),
+            batch_size=vector_store_config.get("batch_size", 256),
+            max_pending_batches=vector_store_config.get("max_pending_batches", 2),
+            encode_processes=vector_store_config.get("encode_processes", 0),
+            embedding_backend=vector_store_config.get("embedding_backend", "torch"),
+            quantize=vector_store_config.get("quantize", False),
+            encode_token_budget=vector_store_config.get("encode_token_budget", 8192),
+            chunk_strategy=vector_store_config.get("chunk_strategy", "headers"),
+            chunk_max_tokens=vector_store_config.get("chunk_max_tokens", 0),
+            chunk_min_tokens=vector_store_config.get("chunk_min_tokens", 32),
+            chunk_overlap_tokens=vector_store_config.get("chunk_overlap_tokens", 32),
+            dedup=vector_store_config.get("dedup", "near"),
+            near_duplicate_threshold=vector_store_config.get("near_duplicate_threshold", 0.9),
+            boilerplate=boilerplate,
+            chunk_processes=vector_store_config.get("chunk_processes", 0)
+        )
+    finally:
+        if embedding_cache:
+            embedding_cache.close()
 
 # --- Stage 3: Packaging ---
 def package_target(target_name: str, config: Dict[str, Any]):
@@ -124,6 +211,13 @@ if __name__ == "__main__":
     parser_scrape = subparsers.add_parser("scrape", help="Scrape a target website and save the results to cache.")
     parser_scrape.add_argument("target", help="The name of the target to scrape (e.g., 'langchain' or 'all').")
     parser_scrape.add_argument("--force", action="store_true", help="Force re-scraping even if cache exists.")
+    parser_scrape.add_argument(
+        "--incremental", action="store_true",
+        help="Refresh an existing cache with conditional requests, reusing unchanged pages."
+    )
+    parser_scrape.add_argument(
+        "--resume", action="store_true", help="Continue an interrupted scrape from its last checkpoint."
+    )
 
     # Process command
     parser_process = subparsers.add_parser("process", help="Process cached data to generate a vector store knowledge pack.")
@@ -147,7 +241,7 @@ if __name__ == "__main__":
 
     for target_name in targets_to_run:
         if args.command == "scrape":
-            scrape_and_cache_target(target_name, config, args.force)
+            scrape_and_cache_target(target_name, config, args.force, args.incremental, args.resume)
         elif args.command == "process":
             process_target_from_cache(target_name, config)
         elif args.command == "package":
@@ -0,0 +1,165 @@
+# pipeline/politeness.py
+import asyncio
+import logging
+import random
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+from urllib.robotparser import RobotFileParser
+
+# Responses that mean "slow down" rather than "this page is broken".
+THROTTLE_STATUSES = {429, 503}
+
+# Consecutive successful responses before a throttled host is allowed to speed up again.
+RECOVERY_STREAK = 10
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parses a Retry-After header, given either in seconds or as an HTTP date."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_crawl_delay(robots_text: str, user_agent: str) -> Optional[float]:
+    """Returns the robots.txt Crawl-delay that applies to `user_agent`, if any."""
+    parser = RobotFileParser()
+    parser.parse(robots_text.splitlines())
+    delay = parser.crawl_delay(user_agent)
+    return float(delay) if delay is not None else None
+
+
+@dataclass
+class _HostState:
+    """Adaptive limits for one host. `limit` and `delay` tighten on throttling and relax on success."""
+    limit: int
+    delay: float
+    min_delay: float
+    active: int = 0
+    next_request_at: float = 0.0
+    successes: int = 0
+    last_backoff_at: float = float("-inf")
+    condition: Optional[asyncio.Condition] = field(default=None, repr=False)
+
+
+class PolitenessScheduler:
+    """
+    Decides when each request to a host may be sent. It enforces a per-host concurrency
+    cap and a minimum delay between requests (raised to the robots.txt Crawl-delay when
+    one is declared), and adapts both to the server: a 429/503 pauses the host for any
+    Retry-After and halves its concurrency, or doubles its delay once it is down to one
+    request at a time. A streak of successes undoes one step at a time, delay first.
+
+    The async engine uses `slot()`; the sequential engine uses `wait_turn()`.
+    """
+    def __init__(
+        self,
+        max_per_host: int = 8,
+        min_delay: float = 0.0,
+        max_retries: int = 3,
+        backoff_base: float = 1.0,
+        max_backoff: float = 60.0
+    ):
+        self.max_per_host = max_per_host
+        self.min_delay = min_delay
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.max_backoff = max_backoff
+        self._hosts: Dict[str, _HostState] = {}
+
+    def _state(self, host: str) -> _HostState:
+        if host not in self._hosts:
+            self._hosts[host] = _HostState(limit=self.max_per_host, delay=self.min_delay, min_delay=self.min_delay)
+        return self._hosts[host]
+
+    def set_crawl_delay(self, host: str, crawl_delay: Optional[float]) -> None:
+        """Applies a robots.txt Crawl-delay as the host's minimum delay between requests."""
+        if crawl_delay is None:
+            return
+        state = self._state(host)
+        state.min_delay = max(self.min_delay, crawl_delay)
+        state.delay = max(state.delay, state.min_delay)
+        logging.info("Honoring Crawl-delay of %.1fs for %s.", crawl_delay, host)
+
+    def _reserve(self, state: _HostState) -> float:
+        """Books the host's next request slot and returns how long to wait for it."""
+        now = time.monotonic()
+        start = max(now, state.next_request_at)
+        state.next_request_at = start + state.delay
+        return start - now
+
+    @asynccontextmanager
+    async def slot(self, host: str):
+        """Waits for a concurrency slot and the host's next request time, then holds the slot."""
+        state = self._state(host)
+        if state.condition is None:
+            state.condition = asyncio.Condition()
+        async with state.condition:
+            await state.condition.wait_for(lambda: state.active < state.limit)
+            state.active += 1
+        try:
+            wait = self._reserve(state)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            yield
+        finally:
+            async with state.condition:
+                state.active -= 1
+                state.condition.notify_all()
+
+    def wait_turn(self, host: str) -> None:
+        """Blocks until the host's next request time (sequential crawls)."""
+        wait = self._reserve(self._state(host))
+        if wait > 0:
+            time.sleep(wait)
+
+    def record(self, host: str, status: int, retry_after: Optional[str] = None) -> None:
+        """Adapts the host's limits to a response status."""
+        state = self._state(host)
+        now = time.monotonic()
+        if status in THROTTLE_STATUSES:
+            state.successes = 0
+            pause = parse_retry_after(retry_after)
+            if pause:
+                state.next_request_at = max(state.next_request_at, now + pause)
+            # Requests already in flight when we slowed down report the same congestion; count it once
+            if now - state.last_backoff_at < max(state.delay, self.backoff_base):
+                return
+            state.last_backoff_at = now
+            if state.limit > 1:
+                state.limit //= 2
+            else:
+                state.delay = min(self.max_backoff, max(state.delay * 2, state.min_delay + self.backoff_base / 4))
+            logging.warning(
+                "Throttled by %s (HTTP %d). Slowing to %d concurrent requests, %.2fs apart.",
+                host, status, state.limit, state.delay
+            )
+            return
+
+        state.successes += 1
+        if state.successes < RECOVERY_STREAK:
+            return
+        state.successes = 0
+        if state.delay > state.min_delay:
+            # Halve the delay, snapping back to the floor once the backoff has mostly decayed
+            halved = state.delay / 2
+            state.delay = halved if halved > state.min_delay + self.backoff_base / 4 else state.min_delay
+        elif state.limit < self.max_per_host:
+            # Waiters re-check the raised limit when the current request releases its slot
+            state.limit += 1
+
+    def retry_delay(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """How long to wait before retrying a throttled request: Retry-After, or jittered exponential backoff."""
+        pause = parse_retry_after(retry_after)
+        if pause is not None:
+            return min(pause, self.max_backoff)
+        backoff = min(self.max_backoff, self.backoff_base * (2 ** attempt))
+        return random.uniform(backoff / 2, backoff)
@@ -1,15 +1,28 @@
+import asyncio
+import hashlib
 import logging
 import os
+import time
 from collections import deque
-from typing import Any, Dict, List, Optional
-from urllib.parse import urljoin, urlparse
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from fnmatch import fnmatch
+from typing import Any, Dict, List, Optional, Set, Tuple
+from urllib.parse import parse_qsl, urlencode, urljoin, urlparse, urlsplit, urlunsplit
 
 import hrequests
+import lxml.etree
+import lxml.html
 from bs4 import BeautifulSoup
 from dotenv import load_dotenv
-from markdownify import markdownify
+from lxml.html import HtmlElement
+from markdownify import MarkdownConverter
 from readability import Document as ReadabilityDocument
 
+from .politeness import THROTTLE_STATUSES, PolitenessScheduler, parse_crawl_delay
+from .sitemap import read_sitemap_entries
+from .storage import CrawlCheckpoint
+
 # Conditional import for Firecrawl, allowing the module to work without it
 try:
     from firecrawl import Firecrawl
@@ -17,18 +30,127 @@ except ImportError:
     logging.warning("Firecrawl library not found. Firecrawl fallback will not be available.")
     Firecrawl = None
 
+# Conditional import for aiohttp, which powers the concurrent crawl engine
+try:
+    import aiohttp
+except ImportError:
+    logging.warning("aiohttp library not found. The async crawl engine will not be available.")
+    aiohttp = None
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/100.0.4896.75 Safari/537.36'
+REQUEST_TIMEOUT = 15
+
 def _is_same_domain(base_url: str, new_url: str) -> bool:
     """Checks if two URLs belong to the same domain."""
     return urlparse(base_url).netloc == urlparse(new_url).netloc
 
-def _extract_rich_metadata(soup: BeautifulSoup, url: str) -> Dict[str, Any]:
+_DEFAULT_PORTS = {"http": "80", "https": "443"}
+
+@dataclass
+class UrlCanonicalizer:
+    """
+    Maps the many spellings of a page's URL to one canonical key, so that
+    `?utm_source=` variants, trailing slashes and `index.html` aliases are
+    recognised as the same page. All options can be set per target in config.toml.
+    """
+    # Query parameters to drop, as fnmatch patterns (e.g. "utm_*").
+    drop_query_params: List[str] = field(default_factory=lambda: ["utm_*", "ref", "fbclid", "gclid"])
+    # Drop the whole query string, for sites that never use it for content.
+    ignore_query: bool = False
+    strip_trailing_slash: bool = True
+    # Directory index file names that alias their directory.
+    index_pages: List[str] = field(default_factory=lambda: ["index.html", "index.htm"])
+
+    def __call__(self, url: str) -> str:
+        parts = urlsplit(url)
+        scheme = parts.scheme.lower()
+        netloc = parts.netloc.lower()
+        if parts.port is not None and _DEFAULT_PORTS.get(scheme) == str(parts.port):
+            netloc = netloc.rsplit(":", 1)[0]
+
+        path = parts.path or "/"
+        head, _, last_segment = path.rpartition("/")
+        if last_segment in self.index_pages:
+            path = head + "/"
+        if self.strip_trailing_slash and len(path) > 1:
+            path = path.rstrip("/") or "/"
+
+        query = ""
+        if not self.ignore_query and parts.query:
+            params = [
+                (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+                if not any(fnmatch(key, pattern) for pattern in self.drop_query_params)
+            ]
+            query = urlencode(sorted(params))
+
+        return urlunsplit((scheme, netloc, path, query, ""))
+
+class CrawlFrontier:
+    """
+    FIFO queue of URLs waiting to be crawled. Membership is tracked in a set of
+    canonical URLs, so each page is queued at most once and checks are O(1).
+    URLs are crawled as first discovered; the canonical form is only the dedup key.
     """
-    Extracts rich metadata from a parsed BeautifulSoup object.
+    def __init__(self, canonicalizer: Optional[UrlCanonicalizer] = None):
+        self.canonicalize = canonicalizer or UrlCanonicalizer()
+        self._queue: deque = deque()
+        self._seen: Set[str] = set()
+
+    def add(self, url: str) -> bool:
+        """Queues a URL unless an equivalent one was already seen. Returns True if queued."""
+        if not self.mark_seen(url):
+            return False
+        self._queue.append(url.split('#')[0])
+        return True
+
+    def mark_seen(self, url: str) -> bool:
+        """Records a URL (e.g. a redirect target) as seen. Returns False if it already was."""
+        key = self.canonicalize(url)
+        if key in self._seen:
+            return False
+        self._seen.add(key)
+        return True
+
+    def pop(self) -> str:
+        return self._queue.popleft()
+
+    def state(self, in_progress: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Returns a JSON-serialisable snapshot of the frontier. URLs in `in_progress`
+        (popped but not finished yet) are put back at the front of the queue.
+        """
+        return {"queue": [*(in_progress or []), *self._queue], "seen": sorted(self._seen)}
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Any], canonicalizer: Optional[UrlCanonicalizer] = None) -> "CrawlFrontier":
+        """Rebuilds a frontier from a snapshot taken with `state()`."""
+        frontier = cls(canonicalizer)
+        frontier._queue.extend(state["queue"])
+        frontier._seen.update(state["seen"])
+        return frontier
+
+    def __contains__(self, url: str) -> bool:
+        return self.canonicalize(url) in self._seen
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+# Parse pages the same way readability does, so the tree can be handed to it directly
+_HTML_PARSER = lxml.html.HTMLParser(encoding='utf-8')
+_UNWANTED_TAGS = ['script', 'style', 'noscript', 'img', 'iframe', 'svg', 'canvas', 'picture', 'source']
+
+def _parse_html(html_content: str) -> HtmlElement:
+    """Parses an HTML page into the single lxml tree shared by all extraction steps."""
+    return lxml.html.document_fromstring(html_content.encode('utf-8', 'replace'), parser=_HTML_PARSER)
+
+def _extract_rich_metadata(tree: HtmlElement, url: str) -> Dict[str, Any]:
+    """
+    Extracts rich metadata from a parsed lxml tree.
     
     Args:
-        soup: A BeautifulSoup object of the HTML page.
+        tree: The root <html> element of the page.
         url: The URL of the page, used for resolving relative links.
 
     Returns:
@@ -48,15 +170,16 @@ def _extract_rich_metadata(soup: BeautifulSoup, url: str) -> Dict[str, Any]:
     }
 
     # Extract title
-    if soup.title and soup.title.string:
-        metadata["title"] = soup.title.string.strip()
+    title = tree.find('.//title')
+    if title is not None and title.text and len(title) == 0:
+        metadata["title"] = title.text.strip()
 
     # Extract language from <html> tag
-    if soup.html and soup.html.get('lang'):
-        metadata["language"] = soup.html.get('lang')
+    if tree.get('lang'):
+        metadata["language"] = tree.get('lang')
 
     # Extract meta tags (description, keywords, Open Graph)
-    for tag in soup.find_all('meta'):
+    for tag in tree.iter('meta'):
         if tag.get('name') == 'description':
             metadata['description'] = tag.get('content')
         elif tag.get('name') == 'keywords':
@@ -75,102 +198,461 @@ def _extract_rich_metadata(soup: BeautifulSoup, url: str) -> Dict[str, Any]:
         metadata["title"] = metadata["og_title"]
         
     # Extract favicon
-    favicon_link = soup.find('link', rel=lambda rel: rel and 'icon' in rel)
-    if favicon_link and favicon_link.get('href'):
-        # Resolve relative URL for the favicon
-        metadata['favicon'] = urljoin(url, favicon_link['href'])
+    for link in tree.iter('link'):
+        if any('icon' in rel for rel in (link.get('rel') or '').split()):
+            if link.get('href'):
+                # Resolve relative URL for the favicon
+                metadata['favicon'] = urljoin(url, link.get('href'))
+            break
         
     # Clean up None values
     return {k: v for k, v in metadata.items() if v is not None}
 
 
-def _get_main_content_markdown(html_content: str, url: str) -> Optional[str]:
+def _get_main_content_markdown(tree: HtmlElement, url: str) -> Optional[str]:
     """
-    Extracts the main content from HTML using readability and converts it to Markdown.
+    Extracts the main content from a parsed page using readability and converts it to Markdown.
     """
     try:
-        doc = ReadabilityDocument(html_content)
-        main_html = doc.summary()
+        # readability works on a cleaned copy of the tree, so it does not re-parse the page
+        main_html = ReadabilityDocument(tree).summary()
 
         if main_html:
             soup = BeautifulSoup(main_html, 'lxml')
-            for unwanted_tag in soup(['script', 'style', 'noscript', 'img', 'iframe', 'svg', 'canvas', 'picture', 'source']):
+            for unwanted_tag in soup(_UNWANTED_TAGS):
                 unwanted_tag.decompose()
-            
-            markdown_content = markdownify(str(soup), heading_style="ATX", strong_em_symbol="*", default_title=doc.title())
-            return markdown_content.strip()
+
+            # readability titles are never empty, so links always get their href as a title
+            converter = MarkdownConverter(heading_style="ATX", strong_em_symbol="*", default_title=True)
+            return converter.convert_soup(soup).strip()
         return None
     except Exception as e:
         logging.error("Failed to extract main content or convert to markdown for %s: %s", url, e, exc_info=True)
         return None
 
-def _scrape_with_hrequests(start_url: str, limit: int) -> List[Dict[str, Any]]:
+def _extract_links(tree: HtmlElement, page_url: str) -> List[str]:
+    """
+    Returns the absolute, fragment-less URLs of all <a href> links on the page.
+    Malformed hrefs (e.g. `http://[broken`) are skipped, so they cost only that link.
+    """
+    links = []
+    for link in tree.iter('a'):
+        href = link.get('href')
+        if href is None:
+            continue
+        try:
+            links.append(urljoin(page_url, href).split('#')[0])
+        except ValueError as e:
+            logging.debug("Skipping malformed link %r on %s: %s", href, page_url, e)
+    return links
+
+def _extract_page(
+    html_content: str,
+    url: str,
+    validators: Optional[Dict[str, str]] = None
+) -> Tuple[Optional[Dict[str, Any]], List[str]]:
+    """
+    Turns a fetched HTML page into a scrape record and the list of links found on it.
+    The page is parsed once, and metadata, links and main content all come from that tree.
+    The record's metadata also carries a hash of the markdown and the response's cache
+    validators (see `_response_validators`), which incremental re-crawls send back.
+
+    Returns:
+        A tuple of (record, links). The record is a {"markdown", "metadata"} dictionary,
+        or None if no main content could be extracted.
+    """
+    try:
+        tree = _parse_html(html_content)
+    except lxml.etree.ParserError:
+        # An empty (or comment-only) body: nothing to extract, which is not an error
+        logging.warning("No main content extracted for %s. This page will not be included in results.", url)
+        return None, []
+
+    # Metadata and links are read before readability, which drops hidden elements from the tree
+    metadata = _extract_rich_metadata(tree, url)
+    links = _extract_links(tree, url)
+
+    # Extract main content as markdown
+    markdown = _get_main_content_markdown(tree, url)
+
+    record = None
+    if markdown:
+        metadata.update(validators or {})
+        metadata["content_hash"] = hashlib.sha256(markdown.encode()).hexdigest()
+        record = {"markdown": markdown, "metadata": metadata}
+    else:
+        logging.warning("No main content extracted for %s. This page will not be included in results.", url)
+
+    return record, links
+
+def _response_validators(headers) -> Dict[str, str]:
+    """Picks the HTTP cache validators worth storing from a response's headers."""
+    validators = {}
+    if headers.get('ETag'):
+        validators['etag'] = headers['ETag']
+    if headers.get('Last-Modified'):
+        validators['last_modified'] = headers['Last-Modified']
+    return validators
+
+def _conditional_headers(record: Optional[Dict[str, Any]]) -> Dict[str, str]:
+    """Builds If-None-Match / If-Modified-Since headers from a previously cached record."""
+    metadata = (record or {}).get("metadata", {})
+    headers = {}
+    if metadata.get("etag"):
+        headers['If-None-Match'] = metadata["etag"]
+    if metadata.get("last_modified"):
+        headers['If-Modified-Since'] = metadata["last_modified"]
+    return headers
+
+def _init_frontier(
+    start_url: str,
+    canonicalizer: Optional[UrlCanonicalizer],
+    seed_urls: Optional[List[str]],
+    previous_records: Optional[List[Dict[str, Any]]],
+    checkpoint: Optional[CrawlCheckpoint] = None
+) -> Tuple[CrawlFrontier, Dict[str, Dict[str, Any]]]:
+    """
+    Creates the crawl frontier from the start URL, any seed URLs and the pages of a
+    previous scrape, or restores it from a checkpoint when resuming. Also returns the
+    previous records keyed by canonical URL, so they can be revalidated with
+    conditional requests.
+    """
+    canonicalizer = canonicalizer or UrlCanonicalizer()
+    previous_pages = {
+        canonicalizer(record["metadata"]["source_url"]): record
+        for record in previous_records or []
+        if record.get("metadata", {}).get("source_url")
+    }
+    if checkpoint and checkpoint.frontier_state:
+        return CrawlFrontier.from_state(checkpoint.frontier_state, canonicalizer), previous_pages
+
+    frontier = CrawlFrontier(canonicalizer)
+    # Previously scraped pages are queued too, since unchanged (304) pages yield no links
+    previous_urls = [record["metadata"]["source_url"] for record in previous_pages.values()]
+    for url in [start_url, *(seed_urls or []), *previous_urls]:
+        frontier.add(url)
+    return frontier, previous_pages
+
+def _scrape_with_hrequests(
+    start_url: str,
+    limit: int,
+    extraction_workers: int = 0,
+    canonicalizer: Optional[UrlCanonicalizer] = None,
+    seed_urls: Optional[List[str]] = None,
+    previous_records: Optional[List[Dict[str, Any]]] = None,
+    checkpoint: Optional[CrawlCheckpoint] = None,
+    scheduler: Optional[PolitenessScheduler] = None
+) -> List[Dict[str, Any]]:
     """
     Scrapes a documentation website using hrequests and BeautifulSoup.
     Prioritizes main content extraction using readability and gathers rich metadata.
+
+    With `extraction_workers` > 0 the crawl is pipelined: fetched HTML is handed to a
+    process pool for extraction while the next pages are fetched, and results are
+    merged back in crawl order.
+
+    With `previous_records` the crawl is incremental: known pages are requested
+    conditionally and their cached record is reused when the server answers 304.
+
+    With a `checkpoint`, records are written to disk instead of kept in memory, and
+    the checkpoint itself is returned in place of the list.
+
+    Requests are paced by the politeness `scheduler`, and throttled (429/503)
+    requests are retried after a backoff.
     """
     logging.info("Attempting primary scrape with hrequests for URL: %s (limit: %d)", start_url, limit)
     session = hrequests.Session()
-    session.headers.update({
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/100.0.4896.75 Safari/537.36'
-    })
+    session.headers.update({'User-Agent': USER_AGENT})
+    scheduler = scheduler or PolitenessScheduler()
+
+    def fetch(url: str, headers: Dict[str, str]):
+        """GETs a page when the scheduler allows it, retrying while the host throttles us."""
+        host = urlparse(url).netloc
+        for attempt in range(scheduler.max_retries + 1):
+            scheduler.wait_turn(host)
+            response = session.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+            retry_after = response.headers.get('Retry-After')
+            scheduler.record(host, response.status_code, retry_after)
+            if response.status_code not in THROTTLE_STATUSES or attempt == scheduler.max_retries:
+                return response
+            delay = scheduler.retry_delay(attempt, retry_after)
+            logging.info("Retrying %s in %.1fs (attempt %d/%d).", url, delay, attempt + 1, scheduler.max_retries)
+            time.sleep(delay)
 
-    queue = deque([start_url])
-    visited_urls = set()
-    results: List[Dict[str, Any]] = []
+    try:
+        robots = session.get(urljoin(start_url, '/robots.txt'), timeout=REQUEST_TIMEOUT)
+        if robots.ok:
+            scheduler.set_crawl_delay(urlparse(start_url).netloc, parse_crawl_delay(robots.text, USER_AGENT))
+    except hrequests.exceptions.ClientException as e:
+        logging.warning("Could not fetch robots.txt for %s: %s", start_url, e)
+
+    frontier, previous_pages = _init_frontier(start_url, canonicalizer, seed_urls, previous_records, checkpoint)
+    results = checkpoint if checkpoint is not None else []
+    not_modified = 0
+
+    executor = ProcessPoolExecutor(max_workers=extraction_workers) if extraction_workers > 0 else None
+    # Pages awaiting extraction, as (url, future) pairs in crawl order
+    pending: deque = deque()
+    max_pending = extraction_workers * 2
+
+    def collect(page_url: str, record: Optional[Dict[str, Any]], links: List[str]) -> None:
+        if record and len(results) < limit:
+            results.append(record)
+
+        # Queue new links from the same domain
+        for absolute_url in links:
+            if _is_same_domain(start_url, absolute_url):
+                frontier.add(absolute_url)
+
+    def collect_next_pending() -> None:
+        page_url, future = pending.popleft()
+        try:
+            collect(page_url, *future.result())
+        except Exception as e:
+            logging.error("An unexpected error occurred while extracting %s: %s", page_url, e, exc_info=True)
 
-    while queue and len(results) < limit:
-        current_url = queue.popleft()
+    try:
+        while (frontier or pending) and len(results) < limit:
+            # Block on the oldest extraction when there is nothing to fetch, the pool
+            # is saturated, or the pages in flight could already fill the limit.
+            if pending and (not frontier or len(pending) >= max_pending or len(results) + len(pending) >= limit):
+                collect_next_pending()
+                continue
 
-        if current_url in visited_urls:
-            continue
+            if checkpoint is not None and checkpoint.due():
+                checkpoint.save(frontier.state(in_progress=[url for url, _ in pending]))
+
+            current_url = frontier.pop()
+            logging.info("Scraping page: %s (Documents found: %d/%d)", current_url, len(results), limit)
+            previous_record = previous_pages.get(frontier.canonicalize(current_url))
+
+            try:
+                response = fetch(current_url, _conditional_headers(previous_record))
+
+                if response.status_code == 304 and previous_record:
+                    not_modified += 1
+                    if executor:
+                        # Queue the cached page behind the extractions in flight to keep crawl order
+                        cached = Future()
+                        cached.set_result((previous_record, []))
+                        pending.append((current_url, cached))
+                    else:
+                        collect(current_url, previous_record, [])
+                    continue
+
+                if not response.ok:
+                    logging.warning(
+                        "Request to %s failed with status code %d: %s",
+                        current_url, response.status_code, response.reason
+                    )
+                    continue
+
+                # Don't crawl the redirect target again under its own URL
+                frontier.mark_seen(str(response.url))
+
+                validators = _response_validators(response.headers)
+                if executor:
+                    pending.append((current_url, executor.submit(_extract_page, response.text, current_url, validators)))
+                else:
+                    collect(current_url, *_extract_page(response.text, current_url, validators))
+
+            except hrequests.exceptions.ClientException as e:
+                logging.warning("Request failed for %s: %s", current_url, e)
+            except Exception as e:
+                logging.error("An unexpected error occurred while processing %s: %s", current_url, e, exc_info=True)
+
+            # Merge finished extractions without waiting, preserving crawl order
+            while pending and pending[0][1].done():
+                collect_next_pending()
+    finally:
+        if executor:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    if previous_pages:
+        logging.info("Reused %d unchanged pages from the previous scrape.", not_modified)
+    logging.info("Hrequests scraping completed. Found %d documents.", len(results))
+    return results
 
-        visited_urls.add(current_url)
+async def _crawl_async(
+    start_url: str,
+    limit: int,
+    max_concurrency: int,
+    max_per_host: int,
+    executor: Optional[ProcessPoolExecutor] = None,
+    canonicalizer: Optional[UrlCanonicalizer] = None,
+    seed_urls: Optional[List[str]] = None,
+    previous_records: Optional[List[Dict[str, Any]]] = None,
+    checkpoint: Optional[CrawlCheckpoint] = None,
+    scheduler: Optional[PolitenessScheduler] = None
+) -> List[Dict[str, Any]]:
+    """
+    Crawls a site with concurrent asyncio tasks sharing one aiohttp session.
+    At most `max_concurrency` requests are in flight overall. Per-host concurrency
+    and pacing are left to the politeness `scheduler`, which starts from
+    `max_per_host` and backs off when the host throttles us. When an executor is
+    given, page extraction runs there instead of blocking the event loop.
+    Records are emitted in crawl order, through a reorder buffer of finished pages.
+    """
+    loop = asyncio.get_running_loop()
+    frontier, previous_pages = _init_frontier(start_url, canonicalizer, seed_urls, previous_records, checkpoint)
+    not_modified = 0
+    results = checkpoint if checkpoint is not None else []
+    scheduler = scheduler or PolitenessScheduler(max_per_host=max_per_host)
+
+    async def crawl_page(session, current_url: str) -> Tuple[Optional[Dict[str, Any]], List[str]]:
+        """Fetches and extracts one page. Returns its record (if any) and the links found on it."""
+        nonlocal not_modified
         logging.info("Scraping page: %s (Documents found: %d/%d)", current_url, len(results), limit)
-
+        previous_record = previous_pages.get(frontier.canonicalize(current_url))
+        host = urlparse(current_url).netloc
         try:
-            response = session.get(current_url, timeout=15)
-            
-            if not response.ok:
-                logging.warning(
-                    "Request to %s failed with status code %d: %s",
-                    current_url, response.status_code, response.reason
+            for attempt in range(scheduler.max_retries + 1):
+                async with scheduler.slot(host):
+                    async with session.get(current_url, headers=_conditional_headers(previous_record)) as response:
+                        retry_after = response.headers.get('Retry-After')
+                        scheduler.record(host, response.status, retry_after)
+                        throttled = response.status in THROTTLE_STATUSES and attempt < scheduler.max_retries
+                        if not throttled:
+                            if response.status == 304 and previous_record:
+                                not_modified += 1
+                                return previous_record, []
+                            if response.status >= 400:
+                                logging.warning(
+                                    "Request to %s failed with status code %d: %s",
+                                    current_url, response.status, response.reason
+                                )
+                                return None, []
+                            final_url = str(response.url)
+                            validators = _response_validators(response.headers)
+                            html_content = await response.text(errors="replace")
+                            break
+                delay = scheduler.retry_delay(attempt, retry_after)
+                logging.info(
+                    "Retrying %s in %.1fs (attempt %d/%d).", current_url, delay, attempt + 1, scheduler.max_retries
                 )
-                continue
-
-            html_content = response.text
-            soup = BeautifulSoup(html_content, 'lxml')
-            
-            # Extract rich metadata first
-            metadata = _extract_rich_metadata(soup, current_url)
-
-            # Extract main content as markdown
-            markdown = _get_main_content_markdown(html_content, current_url)
-            
-            if markdown:
-                results.append({
-                    "markdown": markdown,
-                    "metadata": metadata
-                })
-            else:
-                logging.warning("No main content extracted for %s. This page will not be included in results.", current_url)
-
-            # Find and queue new links from the same domain
-            for link in soup.find_all('a', href=True):
-                href = link['href']
-                absolute_url = urljoin(current_url, href).split('#')[0]
+                await asyncio.sleep(delay)
 
-                if _is_same_domain(start_url, absolute_url) and absolute_url not in visited_urls and absolute_url not in queue:
-                    queue.append(absolute_url)
+            # Don't crawl the redirect target again under its own URL
+            frontier.mark_seen(final_url)
 
-        except hrequests.exceptions.ClientException as e:
+            if executor:
+                record, links = await loop.run_in_executor(executor, _extract_page, html_content, current_url, validators)
+            else:
+                record, links = _extract_page(html_content, current_url, validators)
+            return record, links
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
             logging.warning("Request failed for %s: %s", current_url, e)
         except Exception as e:
             logging.error("An unexpected error occurred while processing %s: %s", current_url, e, exc_info=True)
+        return None, []
 
-    logging.info("Hrequests scraping completed. Found %d documents.", len(results))
+    timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+    connector = aiohttp.TCPConnector(limit=max_concurrency, limit_per_host=max_per_host)
+    async with aiohttp.ClientSession(headers={'User-Agent': USER_AGENT}, timeout=timeout, connector=connector) as session:
+        try:
+            async with session.get(urljoin(start_url, '/robots.txt')) as robots:
+                if robots.status == 200:
+                    crawl_delay = parse_crawl_delay(await robots.text(errors="replace"), USER_AGENT)
+                    scheduler.set_crawl_delay(urlparse(start_url).netloc, crawl_delay)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logging.warning("Could not fetch robots.txt for %s: %s", start_url, e)
+
+        in_flight: Dict[asyncio.Task, int] = {}
+        # Crawl position -> URL for pages started but not yet emitted
+        dispatched: Dict[int, str] = {}
+        # Crawl position -> record (or None) for finished pages waiting on earlier ones
+        finished: Dict[int, Optional[Dict[str, Any]]] = {}
+        next_position = emit_position = 0
+        try:
+            while (frontier or in_flight) and len(results) < limit:
+                # Keep the pipe full, without starting more pages than could still fit the limit
+                while frontier and len(in_flight) < max_concurrency and len(results) + len(dispatched) < limit:
+                    if checkpoint is not None and checkpoint.due():
+                        in_progress = [dispatched[position] for position in sorted(dispatched)]
+                        checkpoint.save(frontier.state(in_progress=in_progress))
+                    current_url = frontier.pop()
+                    in_flight[asyncio.create_task(crawl_page(session, current_url))] = next_position
+                    dispatched[next_position] = current_url
+                    next_position += 1
+
+                done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    record, links = task.result()
+                    finished[in_flight.pop(task)] = record
+                    # Queue new links from the same domain
+                    for absolute_url in links:
+                        if _is_same_domain(start_url, absolute_url):
+                            frontier.add(absolute_url)
+
+                # Emit finished pages in crawl order
+                while emit_position in finished:
+                    record = finished.pop(emit_position)
+                    del dispatched[emit_position]
+                    if record and len(results) < limit:
+                        results.append(record)
+                    emit_position += 1
+        finally:
+            for task in in_flight:
+                task.cancel()
+            await asyncio.gather(*in_flight, return_exceptions=True)
+
+    if previous_pages:
+        logging.info("Reused %d unchanged pages from the previous scrape.", not_modified)
+    return results
+
+def _scrape_with_asyncio(
+    start_url: str,
+    limit: int,
+    max_concurrency: int = 16,
+    max_per_host: int = 8,
+    extraction_workers: int = 0,
+    canonicalizer: Optional[UrlCanonicalizer] = None,
+    seed_urls: Optional[List[str]] = None,
+    previous_records: Optional[List[Dict[str, Any]]] = None,
+    checkpoint: Optional[CrawlCheckpoint] = None,
+    scheduler: Optional[PolitenessScheduler] = None
+) -> List[Dict[str, Any]]:
+    """
+    Scrapes a documentation website with the concurrent asyncio engine.
+    Produces the same records as `_scrape_with_hrequests`, but keeps several
+    requests in flight so the crawl is not bound by serial round-trip latency.
+    With `extraction_workers` > 0, extraction is offloaded to a process pool.
+    """
+    if aiohttp is None:
+        logging.error("aiohttp library not available. Cannot use the async crawl engine.")
+        return []
+
+    logging.info(
+        "Attempting async scrape for URL: %s (limit: %d, concurrency: %d, per host: %d)",
+        start_url, limit, max_concurrency, max_per_host
+    )
+    executor = ProcessPoolExecutor(max_workers=extraction_workers) if extraction_workers > 0 else None
+    try:
+        results = asyncio.run(_crawl_async(
+            start_url, limit, max_concurrency, max_per_host, executor, canonicalizer, seed_urls, previous_records,
+            checkpoint, scheduler
+        ))
+    finally:
+        if executor:
+            executor.shutdown(wait=True, cancel_futures=True)
+    logging.info("Async scraping completed. Found %d documents.", len(results))
     return results
 
+def _discover_sitemap_urls(start_url: str, sitemap_url: Optional[str] = None) -> List[str]:
+    """Returns the same-domain page URLs listed in the site's sitemap, newest first."""
+    session = hrequests.Session()
+    session.headers.update({'User-Agent': USER_AGENT})
+
+    def fetch(url: str) -> Optional[bytes]:
+        try:
+            response = session.get(url, timeout=REQUEST_TIMEOUT)
+        except hrequests.exceptions.ClientException as e:
+            logging.warning("Request failed for %s: %s", url, e)
+            return None
+        return response.content if response.ok else None
+
+    return [entry.url for entry in read_sitemap_entries(start_url, fetch, sitemap_url)]
+
 def _scrape_with_firecrawl(url: str, limit: int) -> List[Dict[str, Any]]:
     """
     Scrapes a documentation website using the Firecrawl API. (Fallback method)
@@ -213,21 +695,82 @@ def _scrape_with_firecrawl(url: str, limit: int) -> List[Dict[str, Any]]:
         logging.error("An unexpected error occurred during the Firecrawl API call: %s", e, exc_info=True)
         return []
 
-def scrape_documentation(url: str, limit: int = 10, use_firecrawl_fallback: bool = True) -> List[Dict[str, Any]]:
-    """
-    Scrapes a documentation website, prioritizing hrequests and falling back to Firecrawl.
+def scrape_documentation(
+    url: str,
+    limit: int = 10,
+    use_firecrawl_fallback: bool = True,
+    engine: str = "hrequests",
+    max_concurrency: int = 16,
+    max_per_host: int = 8,
+    extraction_workers: int = 0,
+    canonicalizer: Optional[UrlCanonicalizer] = None,
+    discovery: str = "links",
+    sitemap_url: Optional[str] = None,
+    previous_records: Optional[List[Dict[str, Any]]] = None,
+    checkpoint: Optional[CrawlCheckpoint] = None,
+    min_delay: float = 0.0,
+    max_retries: int = 3
+) -> List[Dict[str, Any]]:
     """
-    # ... (This function remains unchanged)
-    logging.info("Initiating documentation scrape for URL: %s (limit: %d)", url, limit)
+    Scrapes a documentation website with the selected engine and falls back to Firecrawl.
 
-    hrequests_results = _scrape_with_hrequests(url, limit)
+    Args:
+        url: The start URL of the documentation site.
+        limit: The maximum number of documents to return.
+        use_firecrawl_fallback: Whether to try Firecrawl if the primary engine finds nothing.
+        engine: "hrequests" for the sequential crawler or "async" for the concurrent one.
+        max_concurrency: Requests kept in flight by the async engine.
+        max_per_host: Requests kept in flight per host by the async engine. Lowered
+            adaptively while the host responds with 429/503.
+        extraction_workers: Size of the process pool that extracts pages while fetching
+            continues. 0 extracts inline on the crawl thread.
+        canonicalizer: Decides which URLs count as the same page. Defaults to `UrlCanonicalizer()`.
+        discovery: "links" to find pages by following links from the start URL, or
+            "sitemap" to seed the crawl from the site's sitemap, newest pages first.
+            Falls back to link discovery when no sitemap is found.
+        sitemap_url: Explicit sitemap location for "sitemap" discovery.
+        previous_records: Records from the last scrape of this target. When given, the crawl
+            is incremental: known pages are revalidated with If-None-Match/If-Modified-Since
+            and their cached markdown is reused on a 304 Not Modified.
+        checkpoint: Streams records to disk and periodically snapshots the frontier, so the
+            crawl can be resumed. It is returned in place of the list of records and
+            yields them back from disk when iterated.
+        min_delay: Minimum seconds between requests to a host. A larger robots.txt
+            Crawl-delay takes precedence.
+        max_retries: How often a throttled (429/503) request is retried, honoring
+            Retry-After or backing off exponentially with jitter.
+    """
+    logging.info("Initiating documentation scrape for URL: %s (limit: %d, engine: %s)", url, limit, engine)
+
+    seed_urls = None
+    if checkpoint and checkpoint.frontier_state:
+        logging.info("Resuming from checkpoint; skipping %s discovery.", discovery)
+    elif discovery == "sitemap":
+        seed_urls = _discover_sitemap_urls(url, sitemap_url)
+        if not seed_urls:
+            logging.warning("No sitemap found for %s. Falling back to link discovery.", url)
+    elif discovery != "links":
+        raise ValueError(f"Unsupported discovery mode: {discovery}")
+
+    scheduler = PolitenessScheduler(max_per_host=max_per_host, min_delay=min_delay, max_retries=max_retries)
+    if engine == "async":
+        primary_results = _scrape_with_asyncio(
+            url, limit, max_concurrency, max_per_host, extraction_workers, canonicalizer, seed_urls, previous_records,
+            checkpoint, scheduler
+        )
+    elif engine == "hrequests":
+        primary_results = _scrape_with_hrequests(
+            url, limit, extraction_workers, canonicalizer, seed_urls, previous_records, checkpoint, scheduler
+        )
+    else:
+        raise ValueError(f"Unsupported scrape engine: {engine}")
 
-    if hrequests_results:
-        logging.info("Primary scraping with hrequests successfully obtained %d documents.", len(hrequests_results))
-        return hrequests_results
+    if primary_results:
+        logging.info("Primary scraping with %s successfully obtained %d documents.", engine, len(primary_results))
+        return primary_results
     elif use_firecrawl_fallback:
-        logging.warning("Primary hrequests scraping yielded no results. Attempting Firecrawl fallback.")
+        logging.warning("Primary %s scraping yielded no results. Attempting Firecrawl fallback.", engine)
         return _scrape_with_firecrawl(url, limit)
     else:
-        logging.warning("Primary hrequests scraping yielded no results and Firecrawl fallback is disabled. Returning empty list.")
+        logging.warning("Primary %s scraping yielded no results and Firecrawl fallback is disabled. Returning empty list.", engine)
         return []
\ No newline at end of file
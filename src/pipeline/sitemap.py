@@ -0,0 +1,123 @@
+# pipeline/sitemap.py
+import gzip
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable, List, Optional
+from urllib.parse import urljoin, urlparse
+
+from lxml import etree
+
+# Fetches a URL and returns the raw response body, or None if it could not be fetched.
+Fetcher = Callable[[str], Optional[bytes]]
+
+# Guards against sitemap index loops and pathological sites.
+MAX_SITEMAPS = 100
+
+
+@dataclass
+class SitemapEntry:
+    """A page listed in a sitemap, with its last modification time if the sitemap gives one."""
+    url: str
+    lastmod: Optional[datetime] = None
+
+
+def _parse_lastmod(value: Optional[str]) -> Optional[datetime]:
+    """Parses a W3C datetime (`2024-05-01` or `2024-05-01T10:00:00Z`) into an aware datetime."""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def _decompress(body: bytes) -> bytes:
+    """Transparently decompresses gzipped sitemaps (`sitemap.xml.gz`)."""
+    if body[:2] == b"\x1f\x8b":
+        return gzip.decompress(body)
+    return body
+
+
+def _sitemap_locations(start_url: str, fetch: Fetcher) -> List[str]:
+    """Returns candidate sitemap URLs: those declared in robots.txt, then the conventional paths."""
+    root = urljoin(start_url, "/")
+    locations = []
+
+    robots = fetch(urljoin(root, "robots.txt"))
+    if robots:
+        for line in robots.decode("utf-8", "replace").splitlines():
+            key, _, value = line.partition(":")
+            if key.strip().lower() == "sitemap" and value.strip():
+                locations.append(value.strip())
+
+    # Docs hosted under a sub-path (e.g. /docs) often publish their own sitemap there
+    locations.append(urljoin(start_url if start_url.endswith("/") else start_url + "/", "sitemap.xml"))
+    locations.append(urljoin(root, "sitemap.xml"))
+    locations.append(urljoin(root, "sitemap_index.xml"))
+    return list(dict.fromkeys(locations))
+
+
+def read_sitemap_entries(start_url: str, fetch: Fetcher, sitemap_url: Optional[str] = None) -> List[SitemapEntry]:
+    """
+    Finds and reads the sitemap(s) for a site, following sitemap indexes and
+    decompressing gzipped sitemaps.
+
+    Args:
+        start_url: The start URL of the target; only pages on the same domain are kept.
+        fetch: A function returning the body of a URL, or None on failure.
+        sitemap_url: An explicit sitemap location. If omitted, robots.txt and the
+            conventional locations are tried until one yields entries.
+
+    Returns:
+        The pages listed in the sitemap, newest `<lastmod>` first. Entries without a
+        `<lastmod>` keep their sitemap order after the dated ones. Empty if no sitemap was found.
+    """
+    domain = urlparse(start_url).netloc
+    candidates = [sitemap_url] if sitemap_url else _sitemap_locations(start_url, fetch)
+
+    for candidate in candidates:
+        entries: List[SitemapEntry] = []
+        pending = [candidate]
+        visited = set()
+
+        while pending and len(visited) < MAX_SITEMAPS:
+            location = pending.pop(0)
+            if location in visited:
+                continue
+            visited.add(location)
+
+            body = fetch(location)
+            if not body:
+                continue
+            try:
+                root = etree.fromstring(_decompress(body), parser=etree.XMLParser(recover=True, resolve_entities=False))
+            except (OSError, etree.XMLSyntaxError) as e:
+                logging.warning("Could not parse sitemap %s: %s", location, e)
+                continue
+            if root is None:
+                continue
+
+            # Match on local names so both namespaced and bare sitemaps work
+            tag = etree.QName(root).localname
+            for item in root:
+                if not isinstance(item.tag, str):
+                    continue
+                fields = {etree.QName(child).localname: (child.text or "").strip() for child in item if isinstance(child.tag, str)}
+                loc = fields.get("loc")
+                if not loc:
+                    continue
+                if tag == "sitemapindex":
+                    pending.append(loc)
+                elif urlparse(loc).netloc == domain:
+                    entries.append(SitemapEntry(url=loc, lastmod=_parse_lastmod(fields.get("lastmod"))))
+
+        if entries:
+            logging.info("Read %d pages from sitemap %s (%d sitemap files).", len(entries), candidate, len(visited))
+            oldest = datetime.min.replace(tzinfo=timezone.utc)
+            # sorted() is stable, so undated entries keep their sitemap order
+            return sorted(entries, key=lambda entry: entry.lastmod or oldest, reverse=True)
+
+    logging.info("No usable sitemap found for %s.", start_url)
+    return []
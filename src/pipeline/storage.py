@@ -2,30 +2,208 @@
 import json
 import logging
 import os
-from typing import Any, Dict, List
+import textwrap
+from typing import IO, Any, Dict, Iterable, Iterator, List, Optional
 import networkx as nx
 
-def save_to_cache(data: List[Dict[str, Any]], cache_path: str) -> None:
-    """Saves scraped data to a JSON cache file."""
+try:
+    import zstandard
+    ZSTANDARD_AVAILABLE = True
+except ImportError:
+    ZSTANDARD_AVAILABLE = False
+
+# Cache formats, in the order they are looked for when reading a target's cache.
+# "json" is the legacy single-array format; the line-delimited formats can be streamed.
+CACHE_FORMATS = {"jsonl.zst": ".jsonl.zst", "jsonl": ".jsonl", "json": ".json"}
+
+def cache_path_for(cache_dir: str, target_name: str, cache_format: str = "jsonl") -> str:
+    """Returns the path of a target's scrape cache in the given format."""
+    if cache_format not in CACHE_FORMATS:
+        raise ValueError(f"Unknown cache format '{cache_format}'. Use one of: {', '.join(CACHE_FORMATS)}.")
+    if cache_format == "jsonl.zst" and not ZSTANDARD_AVAILABLE:
+        logging.warning("`zstandard` is not installed. Writing an uncompressed JSONL cache instead.")
+        cache_format = "jsonl"
+    return os.path.join(cache_dir, f"{target_name}_scrape_data{CACHE_FORMATS[cache_format]}")
+
+def find_cache_file(cache_dir: str, target_name: str) -> Optional[str]:
+    """Returns the path of the existing scrape cache for a target, in whichever format it was written."""
+    for extension in CACHE_FORMATS.values():
+        path = os.path.join(cache_dir, f"{target_name}_scrape_data{extension}")
+        if os.path.exists(path):
+            return path
+    return None
+
+def _open_cache(path: str, mode: str, compressed: bool) -> IO[str]:
+    """Opens a cache file as text, (de)compressing it with zstd on the fly if `compressed`."""
+    if compressed:
+        if not ZSTANDARD_AVAILABLE:
+            raise IOError(f"{path} is zstd-compressed. Please install `zstandard` to use it.")
+        return zstandard.open(path, mode, encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+def save_to_cache(data: Iterable[Dict[str, Any]], cache_path: str) -> bool:
+    """
+    Saves scraped data to a cache file. The format follows the extension: one JSON
+    document per line for `.jsonl` (zstd-compressed for `.jsonl.zst`), or a single
+    JSON array for legacy `.json` caches. Documents are written one at a time, so
+    `data` may be a stream (e.g. a `CrawlCheckpoint`) rather than a list.
+
+    The file is written next to its destination and moved into place at the end, so
+    an interrupted save never leaves a truncated cache behind.
+
+    Returns True once the cache file is in place, False if it could not be written.
+    """
     logging.info("Saving scraped data to cache: %s", cache_path)
+    tmp_path = f"{cache_path}.tmp"
     try:
-        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
-        with open(cache_path, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=4)
-        logging.info("Successfully cached %d documents.", len(data))
+        os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+        count = 0
+        with _open_cache(tmp_path, "w", compressed=cache_path.endswith(".zst")) as f:
+            if cache_path.endswith(".json"):
+                f.write("[")
+                for doc in data:
+                    f.write(",\n" if count else "\n")
+                    f.write(textwrap.indent(json.dumps(doc, ensure_ascii=False, indent=4), " " * 4))
+                    count += 1
+                f.write("\n]" if count else "]")
+            else:
+                for doc in data:
+                    f.write(json.dumps(doc, ensure_ascii=False) + "\n")
+                    count += 1
+        os.replace(tmp_path, cache_path)
+        logging.info("Successfully cached %d documents.", count)
+        return True
     except IOError as e:
         logging.error("Failed to save cache file: %s", e)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
+
+def iter_cache(cache_path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Streams scraped documents from a cache file one at a time. Line-delimited caches
+    are read incrementally; legacy `.json` caches are still supported but have to be
+    parsed as a whole.
+
+    A corrupt or truncated cache raises once the bad part is reached, rather than
+    ending the stream early: consumers such as `process_and_embed` treat the end of
+    the stream as the end of the corpus.
+    """
+    if not os.path.exists(cache_path):
+        return
+    logging.info("Loading scraped data from cache: %s", cache_path)
+    try:
+        with _open_cache(cache_path, "r", compressed=cache_path.endswith(".zst")) as f:
+            if cache_path.endswith(".json"):
+                yield from json.load(f)
+                return
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    except (IOError, json.JSONDecodeError) as e:
+        logging.error("Failed to load or parse cache file: %s", e)
+        raise
 
 def load_from_cache(cache_path: str) -> List[Dict[str, Any]]:
-    """Loads scraped data from a JSON cache file if it exists."""
-    if os.path.exists(cache_path):
-        logging.info("Loading scraped data from cache: %s", cache_path)
-        try:
-            with open(cache_path, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except (IOError, json.JSONDecodeError) as e:
-            logging.error("Failed to load or parse cache file: %s", e)
-    return []
+    """Loads all scraped data from a cache file if it exists. Returns [] if it cannot be read."""
+    try:
+        return list(iter_cache(cache_path))
+    except (IOError, json.JSONDecodeError):
+        return []
+
+class CrawlCheckpoint:
+    """
+    On-disk progress of a running scrape. Records are appended to a JSONL file as they
+    are scraped, and the crawl frontier is snapshotted every `interval` pages, so an
+    interrupted crawl can be resumed and never holds more than one page in memory.
+
+    The checkpoint behaves like the list of results a crawl engine builds up: it
+    supports `append`, `len` and iteration (which streams the records back from disk).
+    """
+    def __init__(self, base_path: str, interval: int = 50, resume: bool = False):
+        self.records_path = f"{base_path}.partial.jsonl"
+        self.state_path = f"{base_path}.checkpoint.json"
+        self.interval = interval
+        # The frontier snapshot to resume from, or None for a fresh crawl.
+        self.frontier_state: Optional[Dict[str, Any]] = None
+        self._records_written = 0
+        self._pages_since_save = 0
+
+        os.makedirs(os.path.dirname(self.records_path) or ".", exist_ok=True)
+        if resume and os.path.exists(self.state_path) and os.path.exists(self.records_path):
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            self.frontier_state = state["frontier"]
+            self._records_written = state["records_written"]
+            # Drop records scraped after the snapshot; their pages are still in the frontier.
+            with open(self.records_path, "a", encoding="utf-8") as f:
+                f.truncate(state["records_offset"])
+            logging.info(
+                "Resuming crawl from checkpoint %s (%d documents, %d pages queued).",
+                self.state_path, self._records_written, len(self.frontier_state["queue"])
+            )
+        else:
+            if resume:
+                logging.warning("No checkpoint found at %s. Starting a fresh crawl.", self.state_path)
+            self.discard()
+
+        self._records_file = open(self.records_path, "a", encoding="utf-8")
+
+    def append(self, record: Dict[str, Any]) -> None:
+        """Appends one scraped record to the partial results file."""
+        self._records_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._records_file.flush()
+        self._records_written += 1
+
+    def due(self) -> bool:
+        """Counts a crawled page and returns True when a frontier snapshot is due."""
+        self._pages_since_save += 1
+        return self._pages_since_save >= self.interval
+
+    def save(self, frontier_state: Dict[str, Any]) -> None:
+        """Atomically writes a frontier snapshot consistent with the records written so far."""
+        self._records_file.flush()
+        os.fsync(self._records_file.fileno())
+        state = {
+            "frontier": frontier_state,
+            "records_written": self._records_written,
+            "records_offset": self._records_file.tell(),
+        }
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp_path, self.state_path)
+        self._pages_since_save = 0
+        logging.info("Saved crawl checkpoint (%d documents).", self._records_written)
+
+    def mark_complete(self) -> None:
+        """
+        Snapshots an exhausted frontier after the crawl has finished, so that resuming
+        fetches nothing and goes straight to saving the records.
+        """
+        self.save({"queue": [], "seen": []})
+
+    def discard(self) -> None:
+        """Removes the checkpoint files, e.g. once the crawl has been saved to the cache."""
+        if getattr(self, "_records_file", None):
+            self._records_file.close()
+        for path in (self.records_path, self.state_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def close(self) -> None:
+        self._records_file.close()
+
+    def __len__(self) -> int:
+        return self._records_written
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        if not self._records_file.closed:
+            self._records_file.flush()
+        with open(self.records_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
 
 def save_graph(graph: nx.DiGraph, output_dir: str, target_name: str) -> None:
     """Saves the knowledge graph to a GraphML file."""
@@ -3,26 +3,380 @@ import logging
 import os
 import json
 import hashlib
+import math
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import partial
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import Callable, Iterable, Iterator, List, Dict, Any, Optional, Tuple
 
 import chromadb
-from .cleaner import EnhancedDataCleaner, chunk_document_by_headers
+import numpy as np
+from .cleaner import EnhancedDataCleaner, chunk_document_by_headers, chunk_document_by_tokens
+from .dedup import ChunkDeduplicator
+from .embedding_cache import EmbeddingCache, text_hash
+from .embeddings import EmbeddingBackend, SentenceTransformerBackend, load_embedding_backend
 
-# You'll need a sentence-transformer model
-# Add `sentence-transformers` to your pyproject.toml
-try:
-    from sentence_transformers import SentenceTransformer
-    SENTENCE_TRANSFORMERS_AVAILABLE = True
-except ImportError:
-    SENTENCE_TRANSFORMERS_AVAILABLE = False
+# Number of IDs fetched or deleted per ChromaDB call when syncing a collection.
+SYNC_BATCH_SIZE = 1000
+# Documents sent to a chunking worker process per task.
+PREPARE_GROUP_SIZE = 16
+
+
+def _chunk_id(source_url: str, header: str, content: str, occurrence: int) -> str:
+    """
+    A content-derived chunk ID. It only changes when the chunk itself changes, so edits
+    elsewhere on the page leave it alone. `occurrence` tells apart identical chunks
+    repeated on one page.
+    """
+    identifier = "\x00".join([source_url, header, content, str(occurrence)])
+    return hashlib.sha256(identifier.encode()).hexdigest()
+
+
+@dataclass
+class _PreparedChunk:
+    """A chunk as it comes out of the chunk-and-clean stage."""
+    chunk_id: str
+    header: str
+    content: str
+    cleaned_text: str
+    text_hash: str
+
+
+@dataclass
+class _ChunkBatch:
+    """Chunks waiting to be embedded and upserted together."""
+    ids: List[str] = field(default_factory=list)
+    texts: List[str] = field(default_factory=list)
+    hashes: List[str] = field(default_factory=list)
+    metadatas: List[Dict[str, Any]] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+class _ChunksFileWriter:
+    """
+    Writes chunks.json one chunk at a time, in the same layout as `json.dump(..., indent=2)`.
+    Records are spooled to disk as they come and assembled when the writer is closed,
+    once every page a chunk appears on is known. The file only replaces the previous
+    one at that point.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._spool_path = f"{path}.spool"
+        self._spool = open(self._spool_path, "w", encoding="utf-8")
+
+    def write(self, chunk_id: str, record: Dict[str, Any]) -> None:
+        self._spool.write(json.dumps([chunk_id, record], ensure_ascii=False) + "\n")
+
+    def close(self, duplicate_sources: Optional[Dict[str, List[str]]] = None) -> None:
+        """Writes chunks.json, listing all `source_urls` of chunks that were found on several pages."""
+        duplicate_sources = duplicate_sources or {}
+        self._spool.close()
+        tmp_path = f"{self.path}.tmp"
+        count = 0
+        with open(self._spool_path, "r", encoding="utf-8") as spool, open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("{")
+            for line in spool:
+                chunk_id, record = json.loads(line)
+                if chunk_id in duplicate_sources:
+                    record["source_urls"] = duplicate_sources[chunk_id]
+                body = json.dumps(record, ensure_ascii=False, indent=2).replace("\n", "\n  ")
+                f.write(",\n" if count else "\n")
+                f.write(f"  {json.dumps(chunk_id)}: {body}")
+                count += 1
+            f.write("\n}" if count else "}")
+        os.replace(tmp_path, self.path)
+        os.remove(self._spool_path)
+
+
+def _upsert_batch(collection, batch: _ChunkBatch, embeddings: np.ndarray) -> None:
+    # 'upsert' will add new items and update existing ones with the same ID
+    collection.upsert(
+        ids=batch.ids,
+        embeddings=embeddings.tolist(),
+        documents=batch.texts, # Store cleaned text for Chroma's keyword search
+        metadatas=batch.metadatas
+    )
+
+
+def _make_chunker(
+    backend: EmbeddingBackend,
+    strategy: str,
+    max_tokens: int,
+    min_tokens: int,
+    overlap_tokens: int
+) -> Callable[[str], List[Dict[str, str]]]:
+    """Returns the document chunking function for a chunking strategy."""
+    if strategy == "headers":
+        return chunk_document_by_headers
+    if strategy == "tokens":
+        return partial(
+            chunk_document_by_tokens,
+            count_tokens=backend.token_counter(),
+            max_tokens=max_tokens or backend.max_seq_length,
+            min_tokens=min_tokens,
+            overlap_tokens=overlap_tokens
+        )
+    raise ValueError(f"Unknown chunk strategy '{strategy}'. Use 'headers' or 'tokens'.")
+
+
+def _prepare_document(
+    markdown: str,
+    source_url: str,
+    cleaner: EnhancedDataCleaner,
+    chunk_document: Callable[[str], List[Dict[str, str]]]
+) -> List[_PreparedChunk]:
+    """Chunks one document and cleans and hashes each chunk. Chunks that clean to nothing are dropped."""
+    if not markdown:
+        return []
+    prepared = []
+    occurrences: Dict[tuple, int] = {}
+    for chunk in chunk_document(cleaner.strip_boilerplate(markdown)):
+        chunk_content = chunk["content"]
+        if not chunk_content:
+            continue
+
+        # Create a stable, unique ID for this chunk from its content
+        key = (chunk["header"], chunk_content)
+        occurrences[key] = occurrences.get(key, -1) + 1
+        chunk_id = _chunk_id(source_url, chunk["header"], chunk_content, occurrences[key])
+
+        # Clean the text specifically for the embedding process
+        cleaned_text = cleaner.clean(chunk_content)
+        if cleaned_text:
+            prepared.append(_PreparedChunk(chunk_id, chunk["header"], chunk_content, cleaned_text, text_hash(cleaned_text)))
+    return prepared
+
+
+# Per-process state of the chunking workers, set up once by `_init_prepare_worker`.
+_worker_state: Dict[str, Any] = {}
+
+
+def _init_prepare_worker(chunk_document: Callable[[str], List[Dict[str, str]]], boilerplate: Optional[List[str]]) -> None:
+    _worker_state["cleaner"] = EnhancedDataCleaner(learned_boilerplate=boilerplate)
+    _worker_state["chunk_document"] = chunk_document
+
+
+def _prepare_group(documents: List[Tuple[str, str]]) -> List[List[_PreparedChunk]]:
+    return [
+        _prepare_document(markdown, source_url, _worker_state["cleaner"], _worker_state["chunk_document"])
+        for markdown, source_url in documents
+    ]
+
+
+def _prepare_documents(
+    documents: Iterable[Dict[str, Any]],
+    cleaner: EnhancedDataCleaner,
+    chunk_document: Callable[[str], List[Dict[str, str]]],
+    processes: int = 0
+) -> Iterator[Tuple[str, List[_PreparedChunk]]]:
+    """
+    Yields (source URL, prepared chunks) for every document, in input order. With
+    `processes` > 1, documents are chunked and cleaned by a pool of worker processes,
+    a few groups ahead of the consumer, so the stream is never read far ahead.
+    """
+    def unpack(doc_data: Dict[str, Any]) -> Tuple[str, str]:
+        return doc_data.get("markdown", ""), doc_data.get("metadata", {}).get("source_url", "unknown")
+
+    if processes <= 1:
+        for doc_data in documents:
+            markdown, source_url = unpack(doc_data)
+            yield source_url, _prepare_document(markdown, source_url, cleaner, chunk_document)
+        return
+
+    logging.info(f"Starting {processes} chunking worker processes...")
+    with ProcessPoolExecutor(
+        max_workers=processes,
+        initializer=_init_prepare_worker,
+        initargs=(chunk_document, sorted(cleaner.learned_boilerplate))
+    ) as executor:
+        pending = deque()
+
+        def drain_oldest() -> Iterator[Tuple[str, List[_PreparedChunk]]]:
+            group, future = pending.popleft()
+            yield from zip((source_url for _, source_url in group), future.result())
+
+        group: List[Tuple[str, str]] = []
+        for doc_data in documents:
+            group.append(unpack(doc_data))
+            if len(group) >= PREPARE_GROUP_SIZE:
+                while len(pending) >= 2 * processes:
+                    yield from drain_oldest()
+                pending.append((group, executor.submit(_prepare_group, group)))
+                group = []
+        if group:
+            pending.append((group, executor.submit(_prepare_group, group)))
+        while pending:
+            yield from drain_oldest()
+
+
+def _existing_ids(collection) -> Dict[str, Optional[str]]:
+    """
+    Returns every ID stored in a ChromaDB collection, fetched page by page, with the
+    chunk's stored `source_urls` (None if it was only ever found on one page).
+    """
+    ids = {}
+    offset = 0
+    while True:
+        page = collection.get(include=["metadatas"], limit=SYNC_BATCH_SIZE, offset=offset)
+        for chunk_id, metadata in zip(page["ids"], page["metadatas"]):
+            ids[chunk_id] = (metadata or {}).get("source_urls")
+        if len(page["ids"]) < SYNC_BATCH_SIZE:
+            return ids
+        offset += SYNC_BATCH_SIZE
+
+
+def _sync_source_urls(
+    collection,
+    existing_ids: Dict[str, Optional[str]],
+    seen_ids: set,
+    duplicate_sources: Dict[str, List[str]]
+) -> int:
+    """
+    Records every page a deduplicated chunk appears on in its `source_urls` metadata
+    (newline-separated, as ChromaDB metadata values must be scalars). Chunks that are
+    no longer duplicated are reset to their own URL. Returns the number of updates.
+    """
+    updates = {}
+    for chunk_id, urls in duplicate_sources.items():
+        value = "\n".join(urls)
+        if existing_ids.get(chunk_id) != value:
+            updates[chunk_id] = {"source_url": urls[0], "source_urls": value}
+    for chunk_id, value in existing_ids.items():
+        if value and "\n" in value and chunk_id in seen_ids and chunk_id not in duplicate_sources:
+            own_url = value.split("\n")[0]
+            updates[chunk_id] = {"source_url": own_url, "source_urls": own_url}
+
+    ids = sorted(updates)
+    for start in range(0, len(ids), SYNC_BATCH_SIZE):
+        batch = ids[start:start + SYNC_BATCH_SIZE]
+        collection.update(ids=batch, metadatas=[updates[chunk_id] for chunk_id in batch])
+    return len(ids)
+
+
+def _length_buckets(lengths: List[int], token_budget: int, max_batch_size: int = 256) -> List[List[int]]:
+    """
+    Groups text indices into batches of similar token length. Texts are taken shortest
+    first, and a batch grows while its padded size (texts x longest text) stays within
+    `token_budget`, so short texts are encoded in large batches and long ones in small.
+    """
+    buckets: List[List[int]] = []
+    current: List[int] = []
+    for index in sorted(range(len(lengths)), key=lengths.__getitem__):
+        if current and ((len(current) + 1) * lengths[index] > token_budget or len(current) >= max_batch_size):
+            buckets.append(current)
+            current = []
+        current.append(index)
+    if current:
+        buckets.append(current)
+    return buckets
+
+
+def _encode_bucketed(backend: EmbeddingBackend, texts: List[str], token_budget: int) -> np.ndarray:
+    """
+    Encodes `texts` in length-bucketed batches to cut padding, then scatters the
+    embeddings back so row i still belongs to texts[i].
+    """
+    lengths = [min(length, backend.max_seq_length) for length in backend.count_tokens(texts)]
+    embeddings = None
+    for bucket in _length_buckets(lengths, token_budget):
+        encoded = backend.encode([texts[i] for i in bucket], batch_size=len(bucket))
+        if embeddings is None:
+            embeddings = np.empty((len(texts), encoded.shape[1]), dtype=encoded.dtype)
+        embeddings[bucket] = encoded
+    return embeddings
+
+
+def _encode(
+    backend: EmbeddingBackend,
+    texts: List[str],
+    pool: Optional[Dict[str, Any]] = None,
+    token_budget: int = 0
+) -> np.ndarray:
+    """
+    Encodes `texts` into normalized embeddings, either in this process or sharded across
+    the worker processes of a sentence-transformers multi-process pool. With a
+    `token_budget`, in-process encoding batches texts by length.
+    """
+    if pool is None:
+        if token_budget and texts:
+            return _encode_bucketed(backend, texts, token_budget)
+        return backend.encode(texts)
+    # One shard per worker; the pool returns the embeddings in input order
+    chunk_size = max(1, math.ceil(len(texts) / len(pool["processes"])))
+    embeddings = backend.model.encode_multi_process(texts, pool, chunk_size=chunk_size)
+    return embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+
+def _start_encode_pool(backend: SentenceTransformerBackend, processes: int) -> Dict[str, Any]:
+    """Starts a sentence-transformers multi-process pool of `processes` CPU workers."""
+    logging.info(f"Starting {processes} embedding worker processes...")
+    # Give each worker its share of the cores, unless the user pinned the thread count;
+    # otherwise every worker's torch would start a thread per core
+    pinned = "OMP_NUM_THREADS" in os.environ
+    if not pinned:
+        os.environ["OMP_NUM_THREADS"] = str(max(1, (os.cpu_count() or 1) // processes))
+    try:
+        return backend.model.start_multi_process_pool(target_devices=["cpu"] * processes)
+    finally:
+        if not pinned:
+            del os.environ["OMP_NUM_THREADS"]
+
+
+def _embed_with_cache(
+    backend: EmbeddingBackend,
+    texts: List[str],
+    embedding_cache: Optional[EmbeddingCache],
+    pool: Optional[Dict[str, Any]] = None,
+    token_budget: int = 0,
+    hashes: Optional[List[str]] = None
+) -> np.ndarray:
+    """
+    Encodes `texts`, reusing cached embeddings and encoding each uncached text only once.
+    `hashes` are the texts' `text_hash` values, if already computed.
+    """
+    if embedding_cache is None:
+        return _encode(backend, texts, pool, token_budget)
+
+    hashes = hashes or [text_hash(text) for text in texts]
+    vectors = embedding_cache.get_many(backend.cache_key, hashes)
+    missing = {key: text for key, text in zip(hashes, texts) if key not in vectors}
+    logging.info(
+        "Embedding cache: %d of %d chunks cached, encoding %d unique texts.",
+        len(texts) - sum(1 for key in hashes if key in missing), len(texts), len(missing)
+    )
+    if missing:
+        encoded = _encode(backend, list(missing.values()), pool, token_budget)
+        new_vectors = dict(zip(missing.keys(), encoded))
+        embedding_cache.put_many(backend.cache_key, new_vectors.items())
+        vectors.update(new_vectors)
+    return np.stack([vectors[key] for key in hashes])
 
 
 def process_and_embed(
-    documents: List[Dict[str, Any]],
+    documents: Iterable[Dict[str, Any]],
     output_dir: str,
     target_name: str,
-    model_name: str = 'all-MiniLM-L6-v2'
+    model_name: str = 'all-MiniLM-L6-v2',
+    embedding_cache: Optional[EmbeddingCache] = None,
+    sync: bool = True,
+    batch_size: int = 256,
+    max_pending_batches: int = 2,
+    encode_processes: int = 0,
+    embedding_backend: str = "torch",
+    quantize: bool = False,
+    encode_token_budget: int = 8192,
+    chunk_strategy: str = "headers",
+    chunk_max_tokens: int = 0,
+    chunk_min_tokens: int = 32,
+    chunk_overlap_tokens: int = 32,
+    dedup: str = "near",
+    near_duplicate_threshold: float = 0.9,
+    boilerplate: Optional[List[str]] = None,
+    chunk_processes: int = 0
 ):
     """
     Chunks documents, creates vector embeddings, and saves them to a
@@ -30,20 +384,53 @@ def process_and_embed(
     directory containing the vector store, raw text chunks, and metadata.
 
     Args:
-        documents: A list of scraped document data (dictionaries).
+        documents: Scraped document data (dictionaries). May be a stream, e.g. from
+            `iter_cache`, since documents are consumed one at a time.
         output_dir: The root directory to save the output.
         target_name: The name of the target being processed (e.g., 'langchain').
         model_name: The name of the sentence-transformer model to use for embeddings.
+        embedding_cache: A persistent cache of previously computed embeddings. When
+            given, only chunks whose cleaned text is not cached for this model and backend are encoded.
+        sync: Diff the collection against the current chunks instead of re-upserting
+            everything. Chunk IDs are derived from chunk content, so only new or changed
+            chunks are embedded and upserted, and chunks that no longer exist are deleted.
+        batch_size: Chunks embedded and upserted together. Memory use depends on this
+            (and `max_pending_batches`), not on the size of the corpus.
+        max_pending_batches: Batches allowed to queue up for encoding and for upserting.
+        encode_processes: Worker processes to shard encoding across, each loading the
+            model once (CPU builds). 0 or 1 encodes in this process. Torch backend only.
+        embedding_backend: "torch" (sentence-transformers) or "onnx" (ONNX Runtime).
+        quantize: Use the int8-quantized ONNX model.
+        encode_token_budget: Tokens (padding included) per forward pass when encoding in
+            this process. Texts are bucketed by token length so that short chunks are not
+            padded to the length of long ones. 0 encodes in input order with fixed batches.
+        chunk_strategy: "headers" splits documents at markdown headers only. "tokens" also
+            fits chunks to a token budget measured with the model's tokenizer (see
+            `chunk_document_by_tokens`).
+        chunk_max_tokens: Largest chunk for the "tokens" strategy; 0 uses the model's
+            maximum sequence length.
+        chunk_min_tokens: Chunks smaller than this are merged with a neighbour.
+        chunk_overlap_tokens: Text repeated between consecutive pieces of a long section.
+        dedup: "exact" embeds each distinct cleaned text once; "near" also folds chunks
+            whose text is nearly identical to an earlier one (MinHash/LSH); "off" keeps
+            every chunk. The kept chunk lists every page the text was found on in its
+            `source_urls`.
+        near_duplicate_threshold: Estimated Jaccard similarity of word shingles above
+            which two chunks count as near-duplicates.
+        boilerplate: Lines learned with `EnhancedDataCleaner.learn_boilerplate`. They are
+            stripped from every document before chunking and saved in the pack as
+            boilerplate.json.
+        chunk_processes: Worker processes that chunk, clean and hash documents ahead of
+            embedding, streaming results back in document order. 0 or 1 does this in
+            this process.
     """
-    if not SENTENCE_TRANSFORMERS_AVAILABLE:
-        raise ImportError("Please install `sentence-transformers` to use the vector processor.")
-
     logging.info(f"Starting vector processing for target '{target_name}'...")
-    cleaner = EnhancedDataCleaner()
+    cleaner = EnhancedDataCleaner(learned_boilerplate=boilerplate)
     
     # Initialize the embedding model. This will download it on the first run.
     logging.info(f"Loading embedding model '{model_name}'...")
-    embedding_model = SentenceTransformer(model_name)
+    backend = load_embedding_backend(model_name, backend=embedding_backend, quantize=quantize)
+    chunk_document = _make_chunker(backend, chunk_strategy, chunk_max_tokens, chunk_min_tokens, chunk_overlap_tokens)
     
     # Define the base directory for this target's Knowledge Pack
     target_output_dir = os.path.join(output_dir, target_name)
@@ -54,93 +441,159 @@ def process_and_embed(
     client = chromadb.PersistentClient(path=db_path)
     
     # Create or get the collection. This allows for incremental updates if needed.
+    # The backend's cache key also tells apart the runtime and quantization of the model.
+    collection_metadata = {"embedding_model": model_name, "embedding_cache_key": backend.cache_key}
     collection = client.get_or_create_collection(
         name=target_name,
-        metadata={"embedding_model": model_name}
+        metadata=collection_metadata
     )
-    
-    all_chunks = {}
-    chunks_to_embed = []
-    chunk_ids_to_embed = []
-    metadatas_to_embed = []
-
-    # --- Start Chunking and Processing ---
-    for doc_data in documents:
-        raw_markdown = doc_data.get("markdown", "")
-        metadata = doc_data.get("metadata", {})
-        source_url = metadata.get("source_url", "unknown")
-
-        if not raw_markdown:
-            continue
+    if (collection.metadata or {}).get("embedding_cache_key") != backend.cache_key:
+        # Vectors from another model, backend or quantization cannot be mixed with new ones;
+        # start the collection over (unchanged chunks still come from the embedding cache, if enabled)
+        logging.info(f"Collection '{target_name}' was built with a different embedding model or backend. Rebuilding it.")
+        client.delete_collection(name=target_name)
+        collection = client.create_collection(name=target_name, metadata=collection_metadata)
+    existing_ids = _existing_ids(collection) if sync else {}
+    deduplicator = ChunkDeduplicator(mode=dedup, threshold=near_duplicate_threshold)
+    # representative chunk ID -> every page its text was found on, own page first
+    duplicate_sources: Dict[str, List[str]] = {}
+
+    # Only IDs are kept for the whole corpus; chunk texts and vectors stream through in batches
+    seen_ids = set()
+    batch = _ChunkBatch()
+    chunks_added = 0
+    documents_scraped = 0
+    chunks_file = _ChunksFileWriter(os.path.join(target_output_dir, "chunks.json"))
+
+    # Encoding of one batch overlaps with the upsert of the previous one. Each stage
+    # holds at most `max_pending_batches`, so memory does not grow with the corpus.
+    encoder = ThreadPoolExecutor(max_workers=1)
+    writer = ThreadPoolExecutor(max_workers=1)
+    encoding = deque()
+    writing = deque()
+
+    def submit(batch: _ChunkBatch) -> None:
+        while len(encoding) >= max_pending_batches:
+            hand_off_oldest()
+        encoding.append((batch, encoder.submit(
+            _embed_with_cache, backend, batch.texts, embedding_cache, pool, encode_token_budget, batch.hashes
+        )))
+
+    def hand_off_oldest() -> None:
+        done_batch, future = encoding.popleft()
+        embeddings = future.result()
+        while len(writing) >= max_pending_batches:
+            writing.popleft().result()
+        writing.append(writer.submit(_upsert_batch, collection, done_batch, embeddings))
+
+    pool = None
+    if encode_processes > 1:
+        if isinstance(backend, SentenceTransformerBackend):
+            pool = _start_encode_pool(backend, encode_processes)
+        else:
+            logging.warning("encode_processes only applies to the torch backend; ONNX Runtime already uses all cores.")
+    try:
+        # --- Start Chunking and Processing ---
+        for source_url, chunks in _prepare_documents(documents, cleaner, chunk_document, chunk_processes):
+            documents_scraped += 1
+            for chunk in chunks:
+                chunk_id, cleaned_text = chunk.chunk_id, chunk.cleaned_text
+                if chunk_id in seen_ids:
+                    # The same page was cached twice; keep the first copy
+                    continue
+
+                # Repeated text (navigation, footers, shared tables) is embedded once
+                representative = deduplicator.check(chunk.text_hash, cleaned_text, chunk_id, source_url)
+                if representative:
+                    representative_id, representative_url = representative
+                    urls = duplicate_sources.setdefault(representative_id, [representative_url])
+                    if source_url not in urls:
+                        urls.append(source_url)
+                    continue
+
+                # Store the original, uncleaned text for full-context retrieval
+                seen_ids.add(chunk_id)
+                chunks_file.write(chunk_id, {
+                    "text": chunk.content,
+                    "source_url": source_url,
+                    "header": chunk.header
+                })
+
+                # Unchanged chunks are already stored with their embeddings
+                if chunk_id in existing_ids:
+                    continue
+
+                # Accumulate data for batch embedding
+                batch.ids.append(chunk_id)
+                batch.texts.append(cleaned_text)
+                batch.hashes.append(chunk.text_hash)
+                batch.metadatas.append({"source_url": source_url})
+                if len(batch) >= batch_size:
+                    chunks_added += len(batch)
+                    submit(batch)
+                    batch = _ChunkBatch()
+
+        # --- Batch Embedding and Storage ---
+        if batch:
+            chunks_added += len(batch)
+            submit(batch)
+        while encoding:
+            hand_off_oldest()
+        while writing:
+            writing.popleft().result()
+    finally:
+        encoder.shutdown(wait=True)
+        writer.shutdown(wait=True)
+        if pool is not None:
+            backend.model.stop_multi_process_pool(pool)
 
-        # Split the document into chunks based on markdown headers
-        chunks = chunk_document_by_headers(raw_markdown)
-
-        for i, chunk in enumerate(chunks):
-            chunk_content = chunk["content"]
-            if not chunk_content:
-                continue
-
-            # Create a stable, unique ID for this chunk
-            identifier = f"{source_url}-{i}"
-            chunk_id = hashlib.sha256(identifier.encode()).hexdigest()
-
-            # Clean the text specifically for the embedding process
-            cleaned_text = cleaner.clean(chunk_content)
-            if not cleaned_text:
-                continue
-            
-            # Store the original, uncleaned text for full-context retrieval
-            all_chunks[chunk_id] = {
-                "text": chunk_content,
-                "source_url": source_url,
-                "header": chunk["header"]
-            }
-            
-            # Accumulate data for batch embedding
-            chunks_to_embed.append(cleaned_text)
-            chunk_ids_to_embed.append(chunk_id)
-            metadatas_to_embed.append({"source_url": source_url})
-
-    # --- Batch Embedding and Storage ---
-    if chunks_to_embed:
-        logging.info(f"Embedding {len(chunks_to_embed)} chunks in batches...")
-        
-        # 2. Embed all collected chunks in a single, efficient batch operation
-        embeddings = embedding_model.encode(
-            chunks_to_embed, 
-            show_progress_bar=True,
-            normalize_embeddings=True # Important for cosine similarity
+    if chunks_added:
+        logging.info(f"Embedded and upserted {chunks_added} chunks into ChromaDB collection '{target_name}'.")
+
+    # Remove chunks that no longer exist in the docs (or changed, and got a new ID)
+    stale_ids = sorted(existing_ids.keys() - seen_ids)
+    for start in range(0, len(stale_ids), SYNC_BATCH_SIZE):
+        collection.delete(ids=stale_ids[start:start + SYNC_BATCH_SIZE])
+    if sync:
+        logging.info(
+            f"Synced collection '{target_name}': {chunks_added} chunks added, "
+            f"{len(stale_ids)} removed, {len(seen_ids) - chunks_added} unchanged."
         )
-        
-        # 3. Upsert the data into the ChromaDB collection
-        # 'upsert' will add new items and update existing ones with the same ID
-        collection.upsert(
-            ids=chunk_ids_to_embed,
-            embeddings=embeddings.tolist(),
-            documents=chunks_to_embed, # Store cleaned text for Chroma's keyword search
-            metadatas=metadatas_to_embed
+
+    # Duplicates were dropped; record their pages on the chunk that was kept
+    if dedup != "off":
+        updated = _sync_source_urls(collection, existing_ids, seen_ids, duplicate_sources)
+        logging.info(
+            f"Deduplication skipped {deduplicator.exact_duplicates} exact and {deduplicator.near_duplicates} "
+            f"near-duplicate chunks; updated the sources of {updated} chunks."
         )
-        logging.info(f"Upserted {len(chunk_ids_to_embed)} chunks into ChromaDB collection '{target_name}'.")
 
     # --- Save the Final Artifacts for the Knowledge Pack ---
     # 4. Save the raw text chunks file
-    chunks_path = os.path.join(target_output_dir, "chunks.json")
-    try:
-        with open(chunks_path, "w", encoding="utf-8") as f:
-            json.dump(all_chunks, f, ensure_ascii=False, indent=2)
-        logging.info(f"Saved raw text chunks to {chunks_path}.")
-    except IOError as e:
-        logging.error(f"Failed to save chunks file: {e}")
+    chunks_file.close(duplicate_sources)
+    logging.info(f"Saved raw text chunks to {chunks_file.path}.")
+
+    # Save the learned boilerplate, so the pack records how its text was cleaned
+    if boilerplate is not None:
+        boilerplate_path = os.path.join(target_output_dir, "boilerplate.json")
+        try:
+            with open(boilerplate_path, "w", encoding="utf-8") as f:
+                json.dump(boilerplate, f, ensure_ascii=False, indent=2)
+            logging.info(f"Saved {len(boilerplate)} learned boilerplate lines to {boilerplate_path}.")
+        except IOError as e:
+            logging.error(f"Failed to save boilerplate file: {e}")
 
     # 5. Save the metadata file
     metadata_path = os.path.join(target_output_dir, "metadata.json")
     pack_metadata = {
       "framework": target_name,
       "version": datetime.utcnow().strftime("%Y.%m.%d"),
-      "documents_scraped": len(documents),
-      "chunks_embedded": len(chunk_ids_to_embed),
-      "embedding_model": model_name
+      "documents_scraped": documents_scraped,
+      "chunks_embedded": len(seen_ids),
+      "embedding_model": model_name,
+      "embedding_backend": embedding_backend,
+      "quantized": quantize,
+      "boilerplate_lines": len(boilerplate or [])
     }
     try:
         with open(metadata_path, "w", encoding="utf-8") as f:
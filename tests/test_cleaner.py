@@ -0,0 +1,48 @@
+# tests/test_cleaner.py
+from pipeline.cleaner import EnhancedDataCleaner, chunk_document_by_tokens
+
+
+def count_words(texts):
+    """A stand-in tokenizer: one token per word, plus two special tokens."""
+    return [len(text.split()) + 2 for text in texts]
+
+
+def test_split_paragraph_pieces_overlap():
+    paragraph = " ".join(f"w{i}" for i in range(300))
+    chunks = chunk_document_by_tokens(paragraph, count_words, max_tokens=64, min_tokens=8, overlap_tokens=10)
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert count_words([chunk["content"]])[0] <= 64
+    for previous, current in zip(chunks, chunks[1:]):
+        assert set(previous["content"].split()) & set(current["content"].split())
+
+
+def test_oversized_code_block_is_split_into_complete_blocks():
+    code = "\n".join(f"value_{i} = compute({i})" for i in range(80))
+    markdown = f"## Example\nSome text before the code.\n\n```python\n{code}\n```\n\nSome text after it."
+    chunks = chunk_document_by_tokens(markdown, count_words, max_tokens=64, min_tokens=8, overlap_tokens=10)
+    code_chunks = [chunk for chunk in chunks if "value_" in chunk["content"]]
+    assert len(code_chunks) > 1
+    cleaner = EnhancedDataCleaner()
+    for chunk in chunks:
+        assert count_words([chunk["content"]])[0] <= 64
+        assert chunk["content"].count("```") % 2 == 0
+        assert "value_" not in cleaner.clean(chunk["content"])
+    assert all(chunk["content"].count("```python") == chunk["content"].count("```") // 2 for chunk in code_chunks)
+    # Every line of code is kept
+    kept = "\n".join(chunk["content"] for chunk in code_chunks)
+    assert all(f"value_{i} = compute({i})" in kept for i in range(80))
+
+
+def test_merged_chunk_keeps_both_headings_and_majority_header():
+    body = " ".join(f"b{i}" for i in range(40))
+    chunks = chunk_document_by_tokens(f"## A\nshort\n## B\n{body}", count_words, max_tokens=64, min_tokens=8, overlap_tokens=10)
+    assert len(chunks) == 1
+    assert chunks[0]["header"] == "B"
+    assert "## A" in chunks[0]["content"] and "## B" in chunks[0]["content"]
+
+    chunks = chunk_document_by_tokens(f"## B\n{body}\n## A\nshort", count_words, max_tokens=64, min_tokens=8, overlap_tokens=10)
+    assert len(chunks) == 1
+    assert chunks[0]["header"] == "B"
+    assert chunks[0]["content"].startswith("## B\n")
+    assert "## A" in chunks[0]["content"]